@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import time
+
+import click
+
+from tvod.helpers.files import append_files, concat_files
+from tvod.helpers.remux import CHUNK_SEGMENTS
+
+
+def naive_merge(paths, output_path):
+    # Merge loop used by download_vod before kernel-side copying
+    with open(output_path, 'w+b') as f:
+        for path in paths:
+            with open(path, 'rb') as ff:
+                f.write(ff.read())
+
+
+def pipeline_merge(paths, output_path):
+    # Merge stage of download_vod: one descriptor kept open while batches of segments are appended to it
+    with open(output_path, 'wb') as f:
+        for index in range(0, len(paths), CHUNK_SEGMENTS):
+            append_files(paths[index:index + CHUNK_SEGMENTS], f.fileno())
+
+
+@click.command()
+@click.option('-n', '--segments', type=int, default=500, help='Number of synthetic segments')
+@click.option('-s', '--size', type=float, default=4, help='Size of one segment in MB')
+@click.option('-r', '--rounds', type=int, default=3)
+@click.option('-d', '--directory', default=None, help='Where to write segments (defaults to the temp dir)')
+def main(segments, size, rounds, directory):
+    """Compare segment merge throughput of the naive loop, concat_files and the merge stage of download_vod"""
+
+    work_dir = tempfile.mkdtemp(dir=directory)
+    segment_size = int(size * 1024 * 1024)
+
+    try:
+        paths = []
+        for index in range(segments):
+            path = os.path.join(work_dir, f'{index}.ts')
+            with open(path, 'wb') as f:
+                f.write(os.urandom(segment_size))
+            paths.append(path)
+
+        total_mb = segments * segment_size / 1024 / 1024
+        output_path = os.path.join(work_dir, 'merged.ts')
+
+        for name, merge in [('naive', naive_merge), ('concat_files', concat_files), ('pipeline', pipeline_merge)]:
+            timings = []
+
+            for _ in range(rounds):
+                start = time.perf_counter()
+                merge(paths, output_path)
+                timings.append(time.perf_counter() - start)
+                os.unlink(output_path)
+
+            best = min(timings)
+            click.echo(f'{name:<14} {total_mb:.0f} MB  best {best:.3f}s  {total_mb / best:.0f} MB/s')
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
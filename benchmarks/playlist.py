@@ -0,0 +1,82 @@
+import gc
+import time
+import tracemalloc
+
+import click
+import m3u8
+
+from tvod.helpers.playlist import parse_media_playlist
+
+
+def make_playlist(segments, byte_ranges=False):
+    # Synthetic VOD playlist shaped like Twitch ones, a muted segment every 10
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:3',
+        '#EXT-X-TARGETDURATION:10',
+        '#ID3-EQUIV-TDTG:2024-01-01T00:00:00',
+        '#EXT-X-PLAYLIST-TYPE:EVENT',
+        '#EXT-X-MEDIA-SEQUENCE:0',
+        '#EXT-X-TWITCH-ELAPSED-SECS:0.000',
+        '#EXT-X-TWITCH-TOTAL-SECS:{:.3f}'.format(segments * 10)
+    ]
+
+    for index in range(segments):
+        lines.append('#EXTINF:10.000,')
+        if byte_ranges:
+            lines.append(f'#EXT-X-BYTERANGE:2000000@{index * 2000000}')
+        lines.append(f'{index}{"-muted" if index % 10 == 9 else ""}.ts')
+
+    lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+
+def measure(parse, text, rounds):
+    timings = []
+
+    for _ in range(rounds):
+        start = time.perf_counter()
+        parse(text)
+        timings.append(time.perf_counter() - start)
+
+    # Peak memory while parsing, and memory still held by the result
+    gc.collect()
+    tracemalloc.start()
+    result = parse(text)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, min(timings), peak, retained
+
+
+@click.command()
+@click.option('-n', '--segments', type=int, multiple=True, default=[4500, 20000], help='Segments of the synthetic playlists')
+@click.option('-r', '--rounds', type=int, default=5)
+@click.option('-b', '--byte-ranges', is_flag=True, help='Add a #EXT-X-BYTERANGE tag to every segment')
+def main(segments, rounds, byte_ranges):
+    """Compare parse time and memory of m3u8.loads and parse_media_playlist"""
+
+    for count in segments:
+        text = make_playlist(count, byte_ranges)
+        results = {}
+
+        click.echo(f'{count} segments ({len(text) / 1024:.0f} KB)')
+
+        for name, parse in [
+            ('m3u8.loads', lambda data: m3u8.loads(data).segments),
+            ('parse_media_playlist', lambda data: parse_media_playlist(data)[0])
+        ]:
+            result, best, peak, retained = measure(parse, text, rounds)
+            results[name] = [(segment.uri, segment.duration) for segment in result]
+
+            click.echo(
+                f'  {name:<22} best {best * 1000:8.1f} ms  '
+                f'peak {peak / 1024 / 1024:6.1f} MB  retained {retained / 1024 / 1024:6.1f} MB'
+            )
+
+        if results['m3u8.loads'] != results['parse_media_playlist']:
+            raise click.ClickException('Parsers disagree on the segments')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+import collections
+import http.server
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+TS_PACKET_SIZE = 188
+
+
+def make_segment(size):
+    # Valid MPEG-TS framing (sync byte every 188 bytes) so segments pass the integrity check
+    packets = max(size // TS_PACKET_SIZE, 1)
+    packet = b'\x47' + bytes(range(187))
+    return packet * packets
+
+
+class StandInServer:
+    # Local stand-in for the Twitch endpoints used by tvod: the web page holding the client id, GQL, usher
+    # and a CDN serving synthetic VOD playlists and segments. Every response waits `latency` seconds,
+    # bodies are sent at `bandwidth` bytes/s per connection (0 for unlimited) and segment requests fail
+    # with a 503 at `error_rate`. The time spent serving each request is recorded per route.
+    def __init__(self, segments=200, segment_size=2 * 1024 * 1024, latency=0.0, bandwidth=0, error_rate=0.0):
+        self.segments = segments
+        self.segment = make_segment(segment_size)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+
+        self.durations = collections.defaultdict(list)
+        self.errors = collections.Counter()
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def start(self):
+        stand_in = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *_):
+                pass
+
+            def do_GET(self):
+                stand_in.serve(self, 'GET')
+
+            def do_POST(self):
+                stand_in.serve(self, 'POST')
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def reset(self):
+        with self.lock:
+            self.durations.clear()
+            self.errors.clear()
+
+    def serve(self, request, method):
+        try:
+            self.handle(request, method)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on the request, e.g. a download cancelled after an error
+            request.close_connection = True
+
+    def handle(self, request, method):
+        started_at = time.perf_counter()
+        path = urllib.parse.urlparse(request.path).path
+        route = self.get_route(path)
+
+        body = request.rfile.read(int(request.headers.get('Content-Length') or 0)) if method == 'POST' else b''
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if route == 'segment' and self.error_rate and random.random() < self.error_rate:
+            with self.lock:
+                self.errors[route] += 1
+            self.send(request, 503, b'Service unavailable', 'text/plain')
+        elif route == 'page':
+            self.send(request, 200, b'<script>window.__twilightSettings = {clientId="benchmarkclientid"}</script>', 'text/html')
+        elif route == 'gql':
+            self.send(request, 200, json.dumps(self.get_gql_response(json.loads(body))).encode(), 'application/json')
+        elif route == 'usher':
+            self.send(request, 200, self.get_master_playlist(path).encode(), 'application/vnd.apple.mpegurl')
+        elif route == 'playlist':
+            self.send(request, 200, self.get_media_playlist().encode(), 'application/vnd.apple.mpegurl')
+        elif route == 'segment':
+            self.send(request, 200, self.segment, 'video/mp2t')
+        else:
+            self.send(request, 404, b'Not found', 'text/plain')
+
+        with self.lock:
+            self.durations[route].append(time.perf_counter() - started_at)
+
+    @staticmethod
+    def get_route(path):
+        if path == '/':
+            return 'page'
+        if path == '/gql':
+            return 'gql'
+        if path.startswith('/usher/'):
+            return 'usher'
+        if path.endswith('.m3u8'):
+            return 'playlist'
+        if path.endswith('.ts'):
+            return 'segment'
+        return 'unknown'
+
+    def get_gql_response(self, queries):
+        responses = []
+
+        for query in queries:
+            if 'videoPlaybackAccessToken' in query.get('query'):
+                responses.append({'data': {'videoPlaybackAccessToken': {'value': '{}', 'signature': 'signature'}}})
+            else:
+                vod_id = query.get('variables').get('vodID')
+                responses.append({'data': {'video': {
+                    'broadcastType': 'ARCHIVE',
+                    'seekPreviewsURL': f'{self.url}/cdn/{vod_id}/storyboards/{vod_id}-info.json',
+                    'owner': {'displayName': 'Benchmark', 'login': 'benchmark'},
+                    'title': f'Benchmark {vod_id}',
+                    'createdAt': '2024-01-01T00:00:00Z'
+                }}})
+
+        return responses
+
+    def get_master_playlist(self, path):
+        vod_id = path.rsplit('/', 1)[-1].split('.')[0]
+        return (
+            '#EXTM3U\n'
+            '#EXT-X-STREAM-INF:BANDWIDTH=6000000,RESOLUTION=1920x1080,FRAME-RATE=60.000\n'
+            f'{self.url}/cdn/{vod_id}/chunked/index-dvr.m3u8\n'
+        )
+
+    def get_media_playlist(self):
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:10', '#EXT-X-MEDIA-SEQUENCE:0']
+
+        for index in range(self.segments):
+            lines += ['#EXTINF:10.000,', f'{index}.ts']
+
+        return '\n'.join(lines + ['#EXT-X-ENDLIST']) + '\n'
+
+    def send(self, request, status, body, content_type):
+        request.send_response(status)
+        request.send_header('Content-Type', content_type)
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+
+        if not self.bandwidth:
+            request.wfile.write(body)
+            return
+
+        # Paced in 64 KB writes to hold the connection at `bandwidth` bytes/s
+        chunk_size = 64 * 1024
+        started_at = time.perf_counter()
+
+        for offset in range(0, len(body), chunk_size):
+            request.wfile.write(body[offset:offset + chunk_size])
+            delay = (offset + chunk_size) / self.bandwidth - (time.perf_counter() - started_at)
+            if delay > 0:
+                time.sleep(delay)
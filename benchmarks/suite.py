@@ -0,0 +1,258 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+import click
+
+from stand_ins import StandInServer, make_segment
+
+CASES = ['metadata', 'native', 'aria2c', 'merge', 'download_vod']
+# Metrics compared against a baseline, all of them are better when lower
+COMPARED = ['seconds', 'peak_rss_mb']
+
+
+def percentiles(values, points=(50, 90, 99)):
+    if not values:
+        return {}
+
+    values = sorted(values)
+    return {f'p{point}': values[min(len(values) - 1, int(len(values) * point / 100))] * 1000 for point in points}
+
+
+def peak_rss():
+    # Peak resident memory of this process and of the largest child it waited for (aria2c, ffmpeg), in MB
+    try:
+        import resource
+    except ImportError:
+        return None, None
+
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    )
+
+
+def use_stand_ins(url):
+    from tvod.twitch import async_session, client, session
+
+    for module in [session, async_session]:
+        module.TWITCH_URL = url
+        module.TWITCH_GQL_URL = f'{url}/gql'
+    client.TWITCH_STREAMS_URL = f'{url}/usher/vod'
+
+
+def get_urls(url, segments):
+    return [{'filename': f'{index}.ts', 'url': f'{url}/cdn/1/chunked/{index}.ts'} for index in range(segments)]
+
+
+def run_case(case, url, options, work_dir):
+    # Runs in its own process so that peak RSS belongs to this case only
+    from tvod.helpers.binaries import Binaries
+    from tvod.helpers.exceptions import BinaryException
+
+    tempfile.tempdir = work_dir
+    os.chdir(work_dir)
+    use_stand_ins(url)
+
+    segments = options.get('segments')
+    segment_size = options.get('segment_size')
+    concurrency = options.get('concurrency')
+    result = {'case': case}
+    started_at = time.perf_counter()
+
+    if case == 'metadata':
+        from tvod.twitch.client import Client
+
+        client = Client(cache_path=os.path.join(work_dir, 'cache'))
+        latencies = []
+
+        for index in range(options.get('rounds')):
+            call_started_at = time.perf_counter()
+            client.get_vod_data(str(1000 + index), from_cache=False)
+            latencies.append(time.perf_counter() - call_started_at)
+
+        result['calls'] = percentiles(latencies)
+        result['calls_per_second'] = len(latencies) / sum(latencies)
+    elif case in ['native', 'aria2c']:
+        from tvod.helpers.downloaders import DOWNLOADERS
+
+        if case == 'aria2c':
+            try:
+                Binaries.get('aria2c')
+            except BinaryException as e:
+                return {'case': case, 'skipped': str(e)}
+
+        asyncio.run(DOWNLOADERS.get(case).download(
+            get_urls(url, segments),
+            os.path.join(work_dir, 'segments'),
+            concurrency=concurrency
+        ))
+    elif case == 'merge':
+        from tvod.helpers.files import concat_files
+
+        segment = make_segment(segment_size)
+        paths = []
+
+        for index in range(segments):
+            paths.append(os.path.join(work_dir, f'{index}.ts'))
+            with open(paths[-1], 'wb') as f:
+                f.write(segment)
+
+        started_at = time.perf_counter()
+        concat_files(paths, os.path.join(work_dir, 'merged.ts'))
+    elif case == 'download_vod':
+        from tvod.commands import dl
+
+        try:
+            Binaries.get('ffmpeg')
+            if options.get('downloader') in ['aria2c', 'aria2c-rpc']:
+                Binaries.get('aria2c')
+        except BinaryException as e:
+            return {'case': case, 'skipped': str(e)}
+
+        ctx = types.SimpleNamespace()
+        dl.setup(ctx, downloader=options.get('downloader'), concurrency=concurrency, merge=options.get('merge'), quiet=True)
+
+        async def download():
+            async with ctx.scheduler:
+                await dl.download_vod(ctx, '1')
+
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            asyncio.run(download())
+
+    result['seconds'] = time.perf_counter() - started_at
+
+    if case != 'metadata':
+        size = segments * len(make_segment(segment_size)) / 1024 / 1024
+        result['mb_per_second'] = size / result['seconds']
+
+    result['peak_rss_mb'], result['children_peak_rss_mb'] = peak_rss()
+    return result
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    previous = {result.get('case'): result for result in baseline}
+
+    for result in results:
+        before = previous.get(result.get('case'))
+
+        if not before or any(key in item for item in [result, before] for key in ['skipped', 'failed']):
+            continue
+
+        for metric in COMPARED:
+            if result.get(metric) is None or not before.get(metric):
+                continue
+
+            change = result.get(metric) / before.get(metric) - 1
+            if change > tolerance:
+                regressions.append(f'{result.get("case")} {metric}: {before.get(metric):.2f} -> {result.get(metric):.2f} '
+                                   f'(+{change * 100:.0f}%)')
+
+    return regressions
+
+
+def format_result(result):
+    if 'skipped' in result:
+        return f'{result.get("case"):<13} skipped ({result.get("skipped")})'
+    if 'failed' in result:
+        return f'{result.get("case"):<13} failed ({result.get("failed")})'
+
+    text = f'{result.get("case"):<13} {result.get("seconds"):8.3f}s'
+
+    if 'mb_per_second' in result:
+        text += f'  {result.get("mb_per_second"):8.1f} MB/s'
+    if 'calls_per_second' in result:
+        text += f'  {result.get("calls_per_second"):8.1f} calls/s'
+    if result.get('calls'):
+        text += '  calls ' + ' '.join(f'{name} {value:.1f}ms' for name, value in result.get('calls').items())
+    for route, values in result.get('server', {}).items():
+        text += f'  {route} ' + ' '.join(f'{name} {value:.1f}ms' for name, value in values.items())
+    if result.get('errors'):
+        text += f'  {result.get("errors")} injected errors'
+    if result.get('peak_rss_mb') is not None:
+        text += f'  rss {result.get("peak_rss_mb"):.0f} MB (children {result.get("children_peak_rss_mb"):.0f} MB)'
+
+    return text
+
+
+@click.command()
+@click.option('-c', '--case', 'cases', type=click.Choice(CASES), multiple=True, help='Cases to run (all by default)')
+@click.option('-n', '--segments', type=int, default=200, help='Number of segments of the synthetic VOD')
+@click.option('-s', '--size', type=float, default=2, help='Size of one segment in MB')
+@click.option('-l', '--latency', type=float, default=0, help='Latency added to every response, in ms')
+@click.option('-b', '--bandwidth', type=float, default=0, help='Bandwidth of each connection in MB/s (0 for unlimited)')
+@click.option('-e', '--error-rate', type=float, default=0, help='Share of segment requests failing with a 503')
+@click.option('--concurrency', type=int, default=16)
+@click.option('-r', '--rounds', type=int, default=20, help='Metadata calls measured')
+@click.option('-d', '--downloader', type=click.Choice(['native', 'aria2c', 'aria2c-rpc']), default='native',
+              help='Downloader of the download_vod case')
+@click.option('-m', '--merge', type=click.Choice(['copy', 'concat', 'chunks']), default='copy',
+              help='Merge mode of the download_vod case')
+@click.option('-o', '--output', help='Write the results to this JSON file')
+@click.option('--baseline', help='Compare with the results of a previous run, fail on regressions')
+@click.option('--tolerance', type=float, default=0.2, help='Slowdown or memory growth tolerated against the baseline')
+def main(cases, segments, size, latency, bandwidth, error_rate, concurrency, rounds, downloader, merge, output, baseline,
+         tolerance):
+    """Benchmark metadata, download and merge hot paths against local stand-ins of the Twitch endpoints"""
+
+    options = {
+        'segments': segments,
+        'segment_size': int(size * 1024 * 1024),
+        'concurrency': concurrency,
+        'rounds': rounds,
+        'downloader': downloader,
+        'merge': merge
+    }
+    results = []
+
+    with StandInServer(segments, options.get('segment_size'), latency / 1000, bandwidth * 1024 * 1024, error_rate) as server:
+        for case in cases or CASES:
+            work_dir = tempfile.mkdtemp(prefix=f'tvod-bench-{case}-')
+            server.reset()
+
+            try:
+                with concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                    result = executor.submit(run_case, case, server.url, options, work_dir).result()
+            except Exception as e:
+                result = {'case': case, 'failed': f'{type(e).__name__}: {e}'}
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+            # Time spent by the stand-ins serving each kind of request
+            result['server'] = {route: percentiles(values) for route, values in server.durations.items()}
+            result['errors'] = sum(server.errors.values())
+
+            results.append(result)
+            click.echo(format_result(result))
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    failed = [result for result in results if 'failed' in result]
+    regressions = []
+
+    if baseline:
+        with open(baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), tolerance)
+
+        for regression in regressions:
+            click.echo(f'Regression: {regression}', err=True)
+
+    if failed or regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import shutil
+import struct
+import subprocess
+
+import pytest
+
+from tvod.helpers.remux import _iter_boxes, _walk_boxes, append_chunk, remux_chunk
+
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='ffmpeg is needed to make real chunks')
+
+SEGMENTS = 6
+SEGMENT_DURATION = 2
+TS_PACKET_SIZE = 188
+SDT_PID = 0x11
+
+
+def make_segments(directory):
+    subprocess.run([
+        shutil.which('ffmpeg'), '-v', 'error',
+        '-f', 'lavfi', '-i', 'testsrc=size=160x120:rate=25',
+        '-f', 'lavfi', '-i', 'sine=frequency=440',
+        '-t', str(SEGMENTS * SEGMENT_DURATION),
+        '-c:v', 'libx264', '-g', '25',
+        '-c:a', 'aac',
+        '-f', 'segment', '-segment_time', str(SEGMENT_DURATION), '-segment_format', 'mpegts',
+        os.path.join(directory, '%d.ts')
+    ], check=True)
+
+    paths = [os.path.join(directory, f'{index}.ts') for index in range(SEGMENTS)]
+
+    for path in paths:
+        # The service description isn't needed to remux, and some static ffmpeg builds crash while reading it
+        with open(path, 'rb') as f:
+            data = f.read()
+        packets = [data[i:i + TS_PACKET_SIZE] for i in range(0, len(data), TS_PACKET_SIZE)]
+        with open(path, 'wb') as f:
+            f.write(b''.join(packet for packet in packets if struct.unpack('>H', packet[1:3])[0] & 0x1fff != SDT_PID))
+
+    return paths
+
+
+def read_boxes(path):
+    with open(path, 'rb') as f:
+        top = [box_type for box_type, *_ in _iter_boxes(f, 0, os.path.getsize(path))]
+        sequences = []
+        decode_times = []
+
+        for box_type, offset, header_size, _ in _walk_boxes(f, 0, os.path.getsize(path)):
+            if box_type in [b'mfhd', b'tfdt']:
+                f.seek(offset + header_size)
+                version = f.read(4)[0]
+                value = struct.unpack('>Q' if box_type == b'tfdt' and version else '>I', f.read(8 if version else 4))[0]
+                (sequences if box_type == b'mfhd' else decode_times).append(value)
+
+    return top, sequences, decode_times
+
+
+def test_append_chunks(tmp_path):
+    paths = make_segments(tmp_path)
+    output = os.path.join(tmp_path, 'output.mp4')
+    timeline = None
+
+    with open(output, 'wb') as f:
+        for index in range(0, SEGMENTS, 2):
+            chunk_path = os.path.join(tmp_path, f'chunk{index}.mp4')
+            assert asyncio.run(remux_chunk(paths[index:index + 2], chunk_path)) == 0
+            timeline = append_chunk(chunk_path, f.fileno(), timeline)
+
+    top, sequences, decode_times = read_boxes(output)
+
+    # One init segment, then fragments only: no chunk's mfra index copied in the middle or left at the end
+    assert top[:2] == [b'ftyp', b'moov']
+    assert set(top[2:]) == {b'moof', b'mdat'}
+    assert sequences == list(range(1, len(sequences) + 1))
+    assert min(decode_times) == 0
+
+    ffmpeg = subprocess.run(
+        [shutil.which('ffmpeg'), '-v', 'error', '-i', output, '-f', 'null', '-'],
+        capture_output=True,
+        text=True
+    )
+    assert ffmpeg.returncode == 0
+    assert ffmpeg.stderr == ''
+
+    packets = subprocess.run(
+        [shutil.which('ffmpeg'), '-v', 'error', '-i', output, '-map', '0:v', '-c', 'copy', '-f', 'framemd5', '-'],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    frames = [line for line in packets.stdout.splitlines() if line and not line.startswith('#')]
+    assert len(frames) == SEGMENTS * SEGMENT_DURATION * 25
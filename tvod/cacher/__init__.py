@@ -0,0 +1,5 @@
+from tvod.cacher.backends.jsonfile import JSONBackend
+from tvod.cacher.backends.sqlite import SQLiteBackend
+from tvod.cacher.cacher import Cacher
+
+__all__ = ['Cacher', 'JSONBackend', 'SQLiteBackend']
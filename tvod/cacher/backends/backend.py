@@ -0,0 +1,43 @@
+class CacheBackend:
+    # File extension used by Cacher to build the backend path
+    EXTENSION = None
+
+    def __init__(self, path):
+        self.path = path
+
+    def get(self, key):
+        # Return a (data, timeout) tuple or None, marking the entry as recently used
+        raise NotImplementedError
+
+    def set(self, key, data, timeout=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def items(self, prefix=None):
+        # Yield (key, data, timeout) tuples
+        raise NotImplementedError
+
+    def sweep(self, now):
+        # Remove entries expired at `now`, return how many were removed
+        raise NotImplementedError
+
+    def evict(self, max_entries=None, max_bytes=None, ratio=1.0):
+        # When over the limits, remove least recently used entries until `ratio` of them is met,
+        # return how many were removed with the (entries, bytes) left
+        raise NotImplementedError
+
+    @staticmethod
+    def exceeds(entries, total, max_entries=None, max_bytes=None, ratio=1.0):
+        return (
+            (max_entries is not None and entries > max_entries * ratio)
+            or (max_bytes is not None and total > max_bytes * ratio)
+        )
+
+    def size(self):
+        # Return an (entries, bytes) tuple
+        raise NotImplementedError
+
+    def close(self):
+        pass
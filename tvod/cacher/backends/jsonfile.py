@@ -0,0 +1,147 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from tvod.cacher.backends.backend import CacheBackend
+from tvod.helpers import atomic_write
+from tvod.helpers.lock import FileLock
+
+
+class JSONBackend(CacheBackend):
+    # Legacy backend: whole cache in one JSON file, rewritten on every write
+    EXTENSION = 'json'
+
+    def __init__(self, path):
+        super().__init__(path)
+
+        self.data = {}
+        self.file_lock = FileLock(self.path)
+        self.loaded_stat = None
+        self.dirty = False
+
+        with self.file_lock:
+            if not os.path.exists(self.path):
+                atomic_write(self.path, '{}')
+
+        self._load()
+
+    def get(self, key):
+        self._load()
+
+        entry = self.data.get(key)
+        if not entry:
+            return None
+
+        # Access time is only tracked in memory to avoid a rewrite on every read
+        entry['accessed'] = time.time()
+        return bytes.fromhex(entry.get('data')), entry.get('timeout')
+
+    def set(self, key, data, timeout=None):
+        with self._update():
+            self.data[key] = {'data': data.hex(), 'timeout': timeout, 'accessed': time.time()}
+            self.dirty = True
+
+    def delete(self, key):
+        with self._update():
+            self.dirty = self.data.pop(key, None) is not None
+
+    def items(self, prefix=None):
+        self._load()
+
+        for key, entry in list(self.data.items()):
+            if prefix and not key.startswith(prefix):
+                continue
+            yield key, bytes.fromhex(entry.get('data')), entry.get('timeout')
+
+    @staticmethod
+    def read(path):
+        # Yield (key, data, timeout) tuples of a cache file without creating or locking it
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        for key, entry in data.items():
+            yield key, bytes.fromhex(entry.get('data')), entry.get('timeout')
+
+    def sweep(self, now):
+        with self._update():
+            expired = [key for key, entry in self.data.items() if entry.get('timeout') and entry.get('timeout') < now]
+
+            for key in expired:
+                del self.data[key]
+
+            self.dirty = len(expired) > 0
+
+        return len(expired)
+
+    def evict(self, max_entries=None, max_bytes=None, ratio=1.0):
+        evicted = 0
+
+        with self._update():
+            entries, total = self.size()
+
+            if not self.exceeds(entries, total, max_entries, max_bytes):
+                return 0, entries, total
+
+            for key in sorted(self.data, key=lambda k: self.data[k].get('accessed') or 0):
+                if not self.exceeds(entries, total, max_entries, max_bytes, ratio):
+                    break
+
+                entries -= 1
+                total -= len(self.data.pop(key).get('data')) // 2
+                evicted += 1
+
+            self.dirty = evicted > 0
+
+        return evicted, entries, total
+
+    def size(self):
+        return len(self.data), sum(len(entry.get('data')) // 2 for entry in self.data.values())
+
+    def _load(self, force=False):
+        # Reload only when another process replaced the file since the last read
+        stat = self._stat()
+        if stat is None:
+            self.data = {}
+            self.loaded_stat = None
+            return
+
+        if not force and stat == self.loaded_stat:
+            return
+
+        accessed = {key: entry.get('accessed') for key, entry in self.data.items()}
+
+        try:
+            with open(self.path, 'r') as f:
+                self.data = json.load(f)
+        except ValueError:
+            self.data = {}
+
+        for key, entry in self.data.items():
+            entry['accessed'] = max(entry.get('accessed') or 0, accessed.get(key) or 0)
+
+        self.loaded_stat = stat
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    @contextmanager
+    def _update(self):
+        # Read-modify-write under an inter-process lock so concurrent writers don't drop each other's entries
+        with self.file_lock:
+            self._load(force=True)
+            self.dirty = False
+
+            yield
+
+            if self.dirty:
+                atomic_write(self.path, json.dumps(self.data, indent=4))
+                self.loaded_stat = self._stat()
+                self.dirty = False
@@ -0,0 +1,167 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from tvod.cacher.backends.backend import CacheBackend
+
+
+class SQLiteBackend(CacheBackend):
+    EXTENSION = 'sqlite3'
+
+    # Seconds to wait for another process holding the write lock
+    BUSY_TIMEOUT = 30
+    # Access times kept in memory before being written in one transaction
+    ACCESS_BATCH = 64
+
+    def __init__(self, path):
+        super().__init__(path)
+
+        self.lock = threading.Lock()
+        self.accessed = {}
+        self.connection = sqlite3.connect(
+            self.path,
+            timeout=SQLiteBackend.BUSY_TIMEOUT,
+            isolation_level=None,
+            check_same_thread=False
+        )
+
+        # WAL lets readers in other processes proceed while one process writes,
+        # and a crash mid-write never leaves a half written database behind
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+
+        with self._transaction():
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, '
+                'data BLOB NOT NULL, '
+                'timeout INTEGER'
+                ')'
+            )
+
+            columns = [row[1] for row in self.connection.execute('PRAGMA table_info(cache)')]
+            if 'size' not in columns:
+                self.connection.execute('ALTER TABLE cache ADD COLUMN size INTEGER NOT NULL DEFAULT 0')
+                self.connection.execute('UPDATE cache SET size = length(data)')
+            if 'accessed' not in columns:
+                self.connection.execute('ALTER TABLE cache ADD COLUMN accessed REAL NOT NULL DEFAULT 0')
+
+            self.connection.execute('CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS cache_timeout ON cache (timeout)')
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the database write lock up front so concurrent
+        # processes serialize instead of failing on lock upgrade
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+
+    def get(self, key):
+        with self.lock:
+            row = self.connection.execute('SELECT data, timeout FROM cache WHERE key = ?', (key,)).fetchone()
+
+            if not row:
+                return None
+
+            # Reads don't take the write lock, access times are written in batches
+            self.accessed[key] = time.time()
+            flush = len(self.accessed) >= SQLiteBackend.ACCESS_BATCH
+
+        if flush:
+            self.flush()
+
+        return bytes(row[0]), row[1]
+
+    def set(self, key, data, timeout=None):
+        with self._transaction():
+            self.accessed.pop(key, None)
+            self.connection.execute(
+                'INSERT OR REPLACE INTO cache (key, data, timeout, size, accessed) VALUES (?, ?, ?, ?, ?)',
+                (key, sqlite3.Binary(data), timeout, len(data), time.time())
+            )
+            self._flush()
+
+    def flush(self):
+        with self._transaction():
+            self._flush()
+
+    def _flush(self):
+        if not self.accessed:
+            return
+
+        self.connection.executemany(
+            'UPDATE cache SET accessed = ? WHERE key = ?',
+            [(accessed, key) for key, accessed in self.accessed.items()]
+        )
+        self.accessed.clear()
+
+    def delete(self, key):
+        with self.lock:
+            self.connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def items(self, prefix=None):
+        with self.lock:
+            if prefix:
+                # Range scan on the primary key instead of LIKE so the index is used
+                rows = self.connection.execute(
+                    'SELECT key, data, timeout FROM cache WHERE key >= ? AND key < ?',
+                    (prefix, f'{prefix}\U0010ffff')
+                ).fetchall()
+            else:
+                rows = self.connection.execute('SELECT key, data, timeout FROM cache').fetchall()
+
+        for key, data, timeout in rows:
+            yield key, bytes(data), timeout
+
+    def sweep(self, now):
+        with self.lock:
+            return self.connection.execute(
+                'DELETE FROM cache WHERE timeout IS NOT NULL AND timeout < ?',
+                (now,)
+            ).rowcount
+
+    def evict(self, max_entries=None, max_bytes=None, ratio=1.0):
+        with self._transaction():
+            self._flush()
+            entries, total = self._size()
+
+            if not self.exceeds(entries, total, max_entries, max_bytes):
+                return 0, entries, total
+
+            to_delete = []
+
+            for key, size in self.connection.execute('SELECT key, size FROM cache ORDER BY accessed ASC'):
+                if not self.exceeds(entries, total, max_entries, max_bytes, ratio):
+                    break
+
+                to_delete.append((key,))
+                entries -= 1
+                total -= size
+
+            self.connection.executemany('DELETE FROM cache WHERE key = ?', to_delete)
+
+        return len(to_delete), entries, total
+
+    def size(self):
+        with self.lock:
+            return self._size()
+
+    def _size(self):
+        entries, total = self.connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache').fetchone()
+        return entries, total
+
+    def close(self):
+        try:
+            self.flush()
+        except sqlite3.Error:
+            pass
+
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,151 @@
+import os
+import pickle
+import re
+import time
+
+from tvod.cacher.backends.jsonfile import JSONBackend
+from tvod.cacher.backends.sqlite import SQLiteBackend
+from tvod.cacher.stats import CacheStats
+from tvod.helpers.lock import FileLock
+
+
+class Cacher:
+    # Seconds between two expiry sweeps triggered by writes
+    SWEEP_INTERVAL = 3600
+    # Seconds between two size checks triggered by writes, other processes writing to the same cache
+    # are only accounted for then. Eviction goes down to EVICT_RATIO of the limits to leave some room.
+    EVICT_INTERVAL = 300
+    EVICT_RATIO = 0.9
+
+    def __init__(self, name, cache_path, backend=SQLiteBackend, max_entries=None, max_bytes=None):
+        self.name = name
+        self.cache_path = cache_path
+        self.backend_class = backend
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.counters = CacheStats()
+        self.last_sweep = None
+        self.last_evict = None
+        # (entries, bytes) measured on the last eviction plus what was written since
+        self.estimate = None
+
+        if not re.match(r'^[0-9A-Za-z-_.]+$', name):
+            raise ValueError('Invalid cacher name')
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self.backend = backend(self.path)
+
+        if backend != JSONBackend:
+            self.migrate(self.get_path(JSONBackend.EXTENSION))
+
+        self.sweep()
+        self.evict()
+
+    @property
+    def path(self):
+        return self.get_path(self.backend_class.EXTENSION)
+
+    def get_path(self, extension):
+        final_path = [self.cache_path]
+        name_splited = [n for n in self.name.split('.') if n and len(n) > 0]
+
+        for index, n in enumerate(name_splited):
+            final_path.append(f'{n}{f".{extension}" if len(name_splited) == index + 1 else ""}')
+
+        return os.path.join(*final_path)
+
+    def migrate(self, legacy_path):
+        # Import entries from a cache written by the legacy JSON backend, then drop it.
+        # Its lock file is left in place, removing it would let two processes lock different files.
+        if not os.path.exists(legacy_path):
+            return
+
+        with FileLock(legacy_path):
+            # Another process may have migrated it while this one waited for the lock
+            if not os.path.exists(legacy_path):
+                return
+
+            for key, data, timeout in JSONBackend.read(legacy_path):
+                if timeout and timeout < time.time():
+                    continue
+                if self.backend.get(key) is None:
+                    self.backend.set(key, data, timeout)
+
+            os.unlink(legacy_path)
+
+    @property
+    def stats(self):
+        entries, total = self.backend.size()
+        return CacheStats(**{
+            **self.counters.__dict__,
+            'entries': entries,
+            'bytes': total
+        })
+
+    def get(self, key):
+        entry = self.backend.get(key)
+        if not entry:
+            self.counters.misses += 1
+            return None
+
+        data, timeout = entry
+        if timeout and timeout < time.time():
+            self.counters.misses += 1
+            return None
+
+        try:
+            value = pickle.loads(data)
+        except Exception:
+            # Written by another version of tvod whose classes changed since, treated as a miss
+            self.backend.delete(key)
+            self.counters.misses += 1
+            return None
+
+        self.counters.hits += 1
+        return value
+
+    def set(self, key, data, timeout=None):
+        data = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        self.backend.set(key, data, int(time.time()) + timeout if timeout else None)
+
+        if time.time() - self.last_sweep > Cacher.SWEEP_INTERVAL:
+            self.sweep()
+
+        if self.estimate is None:
+            return
+
+        # Replaced entries are counted twice, which only makes the next eviction check come earlier
+        self.estimate = (self.estimate[0] + 1, self.estimate[1] + len(data))
+
+        if (
+            self.backend.exceeds(*self.estimate, self.max_entries, self.max_bytes)
+            or time.time() - self.last_evict > Cacher.EVICT_INTERVAL
+        ):
+            self.evict()
+
+    def sweep(self):
+        self.last_sweep = time.time()
+        self.counters.expired += self.backend.sweep(self.last_sweep)
+
+    def evict(self):
+        if self.max_entries is None and self.max_bytes is None:
+            return
+
+        self.last_evict = time.time()
+        evicted, entries, total = self.backend.evict(self.max_entries, self.max_bytes, Cacher.EVICT_RATIO)
+        self.counters.evictions += evicted
+        self.estimate = (entries, total)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def values(self, prefix=None):
+        for _, data, timeout in self.backend.items(prefix):
+            if timeout and timeout < time.time():
+                continue
+
+            yield pickle.loads(data)
+
+    def close(self):
+        self.backend.close()
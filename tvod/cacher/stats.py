@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+
+
+class CacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    evictions: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
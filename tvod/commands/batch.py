@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+import click
+from rich.table import Table
+
+from tvod.commands import dl
+from tvod.console import console
+from tvod.helpers.downloaders import DOWNLOADERS
+from tvod.helpers.proxy import Proxy
+
+
+@click.command()
+@click.argument('file', type=click.File('r', encoding='utf-8'), default='-')
+@click.option('-p', '--proxy')
+@click.option('-q', '--quality', multiple=True, callback=dl.validate_qualities,
+              help=f'Qualities to download ({",".join(dl.QUALITIES)}), repeatable or comma separated')
+@click.option('-d', '--downloader', type=click.Choice(list(DOWNLOADERS)), default='native')
+@click.option('-c', '--concurrency', type=click.IntRange(min=1), default=16, help='Parallel connections shared by all jobs')
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=4, help='Number of URLs downloaded at the same time')
+@click.option('-s', '--stream', is_flag=True, help='Pipe segments into ffmpeg while downloading (native downloader)')
+@click.option('-m', '--merge', type=click.Choice(['copy', 'concat', 'chunks']), default='copy')
+@click.option('-F', '--follow', is_flag=True, help='Keep downloading VODs still live until their stream ends')
+@click.option('-l', '--limit-rate', callback=dl.validate_rate,
+              help='Maximum total download rate in bytes/s (K, M and G suffixes allowed), shared fairly between downloads')
+@click.option('-a', '--adaptive', is_flag=True,
+              help='Adjust parallel connections to the network, up to --concurrency (native and aria2c-rpc downloaders)')
+@click.option('-v', '--verbose', is_flag=True, help='Print timings of each phase')
+@click.pass_context
+def cli(
+    ctx,
+    file,
+    proxy=None,
+    quality=None,
+    downloader='native',
+    concurrency=16,
+    jobs=4,
+    stream=False,
+    merge='copy',
+    follow=False,
+    adaptive=False,
+    limit_rate=None,
+    verbose=False
+):
+    """Download every VOD and clip listed in FILE (one URL per line, - for stdin)"""
+
+    urls = []
+
+    for line in file:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            urls.append(line)
+
+    if len(urls) < 1:
+        return console.error('Error: No URL provided')
+
+    if proxy:
+        try:
+            proxy = Proxy.from_string(proxy)
+        except ValueError as e:
+            return console.error(f'Error: {e}')
+
+    if adaptive and downloader == 'aria2c':
+        return console.error("Error: --adaptive can't be used with --downloader aria2c, it runs its own connections")
+
+    dl.setup(
+        ctx,
+        proxy,
+        downloader,
+        concurrency,
+        stream,
+        merge,
+        jobs=jobs,
+        follow=follow,
+        adaptive=adaptive,
+        rate_limit=limit_rate,
+        quiet=True,
+        verbose=verbose
+    )
+
+    print_summary(asyncio.run(run(ctx, urls, quality, jobs)))
+
+
+def print_summary(results):
+    table = Table(title='Summary', title_style='info', header_style='info', border_style='dark_violet')
+    table.add_column('URL', style='white')
+    table.add_column('Status')
+    table.add_column('Time', justify='right', style='white')
+    table.add_column('Result', style='white')
+
+    for url, output, error, elapsed in results:
+        table.add_row(
+            url,
+            '[danger]failed' if error else '[info]done',
+            f'{elapsed:.1f}s',
+            (str(error) or type(error).__name__) if error else output
+        )
+
+    console.print(table)
+
+    failed = len([result for result in results if result[2]])
+    if failed:
+        console.error(f'Error: {failed}/{len(results)} downloads failed')
+
+
+async def run(ctx, urls, quality=None, jobs=4):
+    # All the jobs share the client, the connection pool and the concurrency limit of the scheduler
+    semaphore = asyncio.Semaphore(jobs)
+
+    async def job(url):
+        async with semaphore:
+            start = time.perf_counter()
+
+            try:
+                output = await dl.download(ctx, url, quality)
+            except Exception as e:
+                # Whatever went wrong is reported with this job, the other ones keep going
+                console.print(f'Unable to download [info]{url}[/info]: {e}', style='danger')
+                return url, None, e, time.perf_counter() - start
+
+            return url, output, None, time.perf_counter() - start
+
+    async with ctx.scheduler:
+        try:
+            return await asyncio.gather(*[job(url) for url in urls])
+        finally:
+            dl.report_limiter(ctx)
@@ -1,33 +1,100 @@
 import asyncio
+import contextlib
 import os
 import re
 import shutil
 import subprocess
-import time
 
 import click
 import httpx
-import m3u8
 
 from tvod.console import console
+from tvod.console.progress import Display
+from tvod.helpers import format_timestamp, parse_size, parse_timestamp
 from tvod.helpers.binaries import Binaries
-from tvod.helpers.downloaders import aria2c
+from tvod.helpers.downloaders import DOWNLOADERS
+from tvod.helpers.downloaders.progress import Progress
+from tvod.helpers.downloaders.scheduler import Scheduler
+from tvod.helpers.enums.segment_status import SegmentStatus
 from tvod.helpers.exceptions import DownloaderException, TwitchException
+from tvod.helpers.files import append_files, check_segment, find_corrupted
 from tvod.helpers.paths import DefaultPaths
+from tvod.helpers.playlist import follow_playlist, select_segments
 from tvod.helpers.proxy import Proxy
+from tvod.helpers.remux import CHUNK_SEGMENTS, REMUX_WORKERS, append_chunk, remux_chunk, run_ffmpeg, write_concat_list
+from tvod.helpers.timer import Timings
+from tvod.models.manifest import Manifest, ManifestSegment
+from tvod.pipeline import Pipeline, Stage
 from tvod.twitch.client import Client
 
 
+QUALITIES = ['1080p', '720p', '480p', '360p', '160p']
+VERIFY_RETRIES = 3
+# Batches of a VOD downloading at the same time, the next ones start while the slowest segments of a batch finish
+DOWNLOAD_BATCHES = 4
+
+
+def validate_qualities(ctx, param, value):
+    # Qualities can be repeated (-q 1080p -q 360p) or comma separated (-q 1080p,360p)
+    qualities = get_qualities(value)
+
+    for quality in qualities:
+        if quality not in QUALITIES:
+            raise click.BadParameter(f'{quality} is not one of {", ".join(QUALITIES)}')
+
+    return qualities or None
+
+
+def validate_rate(ctx, param, value):
+    if not value:
+        return None
+
+    try:
+        return parse_size(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
 @click.command()
 @click.argument('url')
 @click.option('-p', '--proxy')
-@click.option('-q', '--quality', type=click.Choice(['1080p', '720p', '480p', '360p', '160p']))
+@click.option('-q', '--quality', multiple=True, callback=validate_qualities,
+              help=f'Qualities to download ({",".join(QUALITIES)}), several ones are downloaded at the same time')
+@click.option('-d', '--downloader', type=click.Choice(list(DOWNLOADERS)), default='aria2c')
+@click.option('-c', '--concurrency', type=click.IntRange(min=1), default=16)
+@click.option('-s', '--stream', is_flag=True, help='Pipe segments into ffmpeg while downloading (native downloader)')
+@click.option('-m', '--merge', type=click.Choice(['copy', 'concat', 'chunks']), default='copy',
+              help='Merge segments into one ts file (copy), let ffmpeg read them in place (concat) '
+                   'or remux them in parallel mp4 chunks while downloading (chunks)')
+@click.option('-F', '--follow', is_flag=True, help='Keep downloading a VOD still live until its stream ends')
+@click.option('--start', help='Only download the VOD from this time (seconds, HH:MM:SS or 1h2m3s)')
+@click.option('--end', help='Only download the VOD up to this time (seconds, HH:MM:SS or 1h2m3s)')
+@click.option('-l', '--limit-rate', callback=validate_rate,
+              help='Maximum total download rate in bytes/s (K, M and G suffixes allowed), shared fairly between downloads')
+@click.option('-a', '--adaptive', is_flag=True,
+              help='Adjust parallel connections to the network, up to --concurrency (native and aria2c-rpc downloaders)')
+@click.option('-v', '--verbose', is_flag=True, help='Print timings of each phase')
 @click.pass_context
-def cli(ctx, url, proxy=None, quality=None):
+def cli(
+    ctx,
+    url,
+    proxy=None,
+    quality=None,
+    downloader='aria2c',
+    concurrency=16,
+    stream=False,
+    merge='copy',
+    follow=False,
+    start=None,
+    end=None,
+    adaptive=False,
+    limit_rate=None,
+    verbose=False
+):
     """Download VOD and clips"""
 
     try:
-        url_type, url_id = Client.parse_url(url)
+        Client.parse_url(url)
     except TwitchException as e:
         return console.error(f'Error: {e}')
 
@@ -37,27 +104,209 @@ def cli(ctx, url, proxy=None, quality=None):
         except ValueError as e:
             return console.error(f'Error: {e}')
 
+    try:
+        start = parse_timestamp(start) if start else None
+        end = parse_timestamp(end) if end else None
+    except ValueError as e:
+        return console.error(f'Error: {e}')
+
+    if start is not None and end is not None and end <= start:
+        return console.error('Error: --end must be after --start')
+
+    if follow and (start is not None or end is not None):
+        return console.error("Error: --follow can't be used with --start/--end")
+
+    if adaptive and downloader == 'aria2c':
+        return console.error("Error: --adaptive can't be used with --downloader aria2c, it runs its own connections")
+
+    setup(
+        ctx,
+        proxy,
+        downloader,
+        concurrency,
+        stream,
+        merge,
+        follow=follow,
+        start=start,
+        end=end,
+        adaptive=adaptive,
+        rate_limit=limit_rate,
+        verbose=verbose
+    )
+
+    async def run():
+        async with ctx.scheduler:
+            try:
+                await download(ctx, url, quality)
+            finally:
+                report_limiter(ctx)
+
+    try:
+        asyncio.run(run())
+    except (TwitchException, DownloaderException) as e:
+        console.error(f'Error: {e}')
+
+
+def setup(
+    ctx,
+    proxy=None,
+    downloader='aria2c',
+    concurrency=16,
+    stream=False,
+    merge='copy',
+    jobs=1,
+    follow=False,
+    start=None,
+    end=None,
+    adaptive=False,
+    rate_limit=None,
+    quiet=False,
+    verbose=False,
+    progress_callback=None
+):
+    # Everything shared by the downloads of one run is stored on the click context,
+    # `progress_callback` receives the ProgressEvent of every download
     ctx.client = Client(proxy=proxy)
+    ctx.scheduler = Scheduler(
+        DOWNLOADERS.get(downloader),
+        proxy,
+        concurrency,
+        jobs,
+        adaptive=adaptive,
+        rate_limit=rate_limit
+    )
+    ctx.stream = stream
+    ctx.merge = merge
+    ctx.follow = follow
+    ctx.start = start
+    ctx.end = end
+    ctx.quiet = quiet
+    ctx.verbose = verbose
+    ctx.progress_callback = progress_callback
+    ctx.display = Display(console)
+
+
+def status(ctx, text, progress=None):
+    # Steps running at the same time get one row each in the shared display,
+    # nothing is shown when several downloads run at once
+    if ctx.quiet:
+        return contextlib.nullcontext()
+    return ctx.display.row(text, progress)
+
+
+def report_limiter(ctx):
+    if ctx.scheduler.limiter:
+        console.print(f'Adaptive concurrency ended at [info]{ctx.scheduler.limiter}[/info]', style='white')
+
+
+def report_progress(ctx, progress):
+    if ctx.verbose and progress.segments_done:
+        console.print(f'Downloaded [info]{progress}[/info]', style='white')
+
+
+def get_qualities(quality=None):
+    # Accept one quality, a comma separated string or a list of them
+    if not quality:
+        return []
+
+    if isinstance(quality, str):
+        quality = [quality]
+
+    return list(dict.fromkeys(
+        item.strip() for value in quality for item in value.split(',') if item.strip()
+    ))
+
+
+async def gather_streams(coroutines):
+    # Download several qualities at once, the others are cancelled as soon as one fails
+    tasks = [asyncio.create_task(coroutine) for coroutine in coroutines]
+
+    try:
+        outputs = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    return outputs[0] if len(outputs) == 1 else outputs
+
+
+def clean_string(text):
+    return re.sub(r' +', ' ', re.sub(r'[/\\:@?<>"*]+', ' ', text))
+
+
+def get_output_path(vod, stream, start=None, end=None):
+    time_range = ''
+
+    if start is not None or end is not None:
+        time_range = f' [{format_timestamp(start or 0)}-{format_timestamp(end) if end is not None else "end"}]'
+
+    return os.path.join(
+        DefaultPaths.get_download_path(),
+        f'{clean_string(vod.title)} - {clean_string(vod.streamer)} [{stream.resolution}]{time_range}.mp4'
+    )
+
+
+async def download(ctx, url, quality=None):
+    url_type, url_id = Client.parse_url(url)
 
     if url_type == 'videos':
-        download_vod(ctx, url_id, quality, proxy)
+        return await download_vod(ctx, url_id, quality)
     elif url_type == 'clip':
-        download_clip(ctx, url_id, quality, proxy)
-    else:
-        console.error(f'Error: {url_type}s not handled yet')
+        return await download_clip(ctx, url_id, quality)
 
+    raise TwitchException(f'{url_type}s not handled yet')
 
-def download_vod(ctx, vod_id, quality, proxy):
-    with console.status(
-        '[white]Fetching VOD data ...',
-        spinner_style='info',
-        spinner='arc'
-    ):
-        try:
-            vod = ctx.client.get_vod_data(vod_id)
-        except TwitchException as e:
-            time.sleep(1)
-            return console.error(f'Error: {e}')
+
+async def download_segments(ctx, urls, download_path, progress=None, share=None, parts=1):
+    # Download `urls` then check the segments, only the corrupted ones are fetched again
+    for attempt in range(VERIFY_RETRIES + 1):
+        await ctx.scheduler.download(urls, download_path, progress, share, parts)
+
+        paths = {os.path.join(download_path, url.get('filename')): url for url in urls}
+        corrupted = await asyncio.to_thread(find_corrupted, list(paths))
+
+        if not corrupted:
+            return
+
+        # Removed so a failed run doesn't keep them as finished segments
+        for path in corrupted:
+            if os.path.exists(path):
+                os.unlink(path)
+
+        urls = [paths.get(path) for path in corrupted]
+
+        if attempt >= VERIFY_RETRIES:
+            break
+
+        if progress:
+            progress.add_total(len(urls))
+            for path, reason in corrupted.items():
+                progress.retry(paths.get(path).get('url'), reason)
+
+        if ctx.verbose:
+            console.print(f'Fetching [info]{len(urls)}[/info] corrupted segments again', style='white')
+
+    raise DownloaderException(f'{len(urls)} segments still corrupted after {VERIFY_RETRIES} retries')
+
+
+async def download_vod(ctx, vod_id, quality=None):
+    # `quality` can list several qualities, the VOD data and the connections are shared between their downloads
+    qualities = get_qualities(quality)
+    timings = Timings()
+
+    with status(ctx, '[white]Fetching VOD data ...'):
+        vod = await asyncio.to_thread(
+            ctx.client.get_vod_data,
+            vod_id,
+            True,
+            qualities[0] if len(qualities) == 1 else None,
+            timings
+        )
+
+    if ctx.verbose and timings:
+        console.print(f'Fetched VOD data ([info]{timings}[/info])', style='white')
 
     console.print(
         f'Starting download of '
@@ -67,114 +316,375 @@ def download_vod(ctx, vod_id, quality, proxy):
         style='white'
     )
 
-    stream = vod.filter_quality(quality)
+    streams = []
 
-    if not stream:
-        return console.error(f'Error: Unable to find {quality} stream')
+    for quality in qualities or [None]:
+        stream = vod.filter_quality(quality)
 
-    with ctx.client.session.get_session() as session:
-        req = session.get(stream.url)
+        if not stream:
+            raise TwitchException(f'Unable to find {quality} stream')
+        streams.append(stream)
 
-    if req.status_code != httpx.codes.OK:
-        return console.error('Error: Unable to fetch stream')
+    # One bandwidth share for the whole job, whatever the number of qualities and batches it downloads
+    share = ctx.scheduler.share()
 
-    parsed_stream = m3u8.loads(req.text)
+    return await gather_streams([download_vod_stream(ctx, vod, stream, share, len(streams)) for stream in streams])
 
-    temp_dir = os.path.join(DefaultPaths.get_temp_path(), f'{vod.id}.{stream.resolution}')
-    temp_file = os.path.join(
-        DefaultPaths.get_temp_path(),
-        f'{vod.id}.{stream.resolution}',
-        f'{vod.id}.{stream.resolution}.ts'
-    )
 
-    def clean_string(text):
-        return re.sub(r' +', ' ', re.sub(r'[/\\:@?<>"*]+', ' ', text))
+async def download_vod_stream(ctx, vod, stream, share=None, parts=1):
+    # `parts` streams of the job download side by side, external downloaders get their part of the limits
+    # Served from the cache when this playlist was probed or downloaded before
+    try:
+        playlist = await asyncio.to_thread(ctx.client.get_playlist, stream.url)
+    except (TwitchException, httpx.HTTPError):
+        raise DownloaderException('Unable to fetch stream')
 
-    downloaded_file = os.path.join(
-        DefaultPaths.get_download_path(),
-        f'{clean_string(vod.title)} - {clean_string(vod.streamer)} [{stream.resolution}].mp4'
-    )
+    segments = playlist.segments
+    trim_args = []
+
+    if ctx.start is not None or ctx.end is not None:
+        # Only the segments covering the window are fetched, ffmpeg then cuts the extra part of the first and last ones
+        segments, offset = select_segments(segments, ctx.start, ctx.end)
+
+        if not segments:
+            raise TwitchException('Time range is outside of the VOD')
+
+        if offset:
+            trim_args += ['-ss', f'{offset:.3f}']
+        if ctx.end is not None:
+            trim_args += ['-t', f'{ctx.end - (ctx.start or 0):.3f}']
+
+    temp_dir = os.path.join(DefaultPaths.get_temp_path(), f'{vod.id}.{stream.resolution}')
+    temp_file = os.path.join(temp_dir, f'{vod.id}.{stream.resolution}.ts')
+    downloaded_file = get_output_path(vod, stream, ctx.start, ctx.end)
 
     if os.path.exists(downloaded_file):
         os.unlink(downloaded_file)
 
-    if os.path.exists(temp_dir):
+    if ctx.follow and not playlist.ended:
+        await follow_vod(ctx, stream, temp_dir, temp_file, downloaded_file, share, parts)
+
+        console.print(
+            'Successfully downloaded '
+            f'[info]{vod.title}[/info]'
+            f' by '
+            f'[info]{vod.streamer}[/info]'
+            f' in '
+            f'[info]{stream.resolution}[/info]',
+            style='white'
+        )
+        return downloaded_file
+
+    if ctx.stream:
+        progress = Progress(ctx.progress_callback)
+        progress.add_total(len(segments))
+
+        with status(ctx, f'[white]Download [info]{stream.resolution}[/info] segments into [info]mp4 file', progress):
+            returncode = await stream_segments(
+                ctx,
+                [f'{stream.base_url}/{segment.uri}' for segment in segments],
+                downloaded_file,
+                trim_args,
+                progress,
+                share
+            )
+
+            if returncode != 0:
+                raise DownloaderException('Unable to convert file')
+
+        report_progress(ctx, progress)
+
+        console.print(
+            'Successfully downloaded '
+            f'[info]{vod.title}[/info]'
+            f' by '
+            f'[info]{vod.streamer}[/info]'
+            f' in '
+            f'[info]{stream.resolution}[/info]',
+            style='white'
+        )
+        return downloaded_file
+
+    manifest_path = os.path.join(temp_dir, 'manifest.json')
+    manifest = Manifest(
+        id=vod.id,
+        resolution=stream.resolution,
+        playlist=playlist.text,
+        segments=[
+            ManifestSegment(filename=segment.uri, url=f'{stream.base_url}/{segment.uri}')
+            for segment in segments
+        ]
+    )
+
+    with status(ctx, '[white]Check [info]previous download'):
+        reused = await asyncio.to_thread(manifest.merge, Manifest.load(manifest_path), temp_dir)
+
+    if reused:
+        console.print(
+            f'Reusing [info]{len(reused)}/{len(manifest.segments)}[/info] segments '
+            f'([info]{sum(segment.size for segment in reused) / 1024 / 1024:.1f} MB[/info]) from a previous run',
+            style='white'
+        )
+    elif os.path.exists(temp_dir):
         shutil.rmtree(temp_dir)
 
-    with console.status(
-        '[white]Download [info]raw ts segments',
-        spinner_style='info',
-        spinner='arc'
-    ):
-        try:
-            asyncio.run(aria2c.download(
-                [
-                    {'filename': segment.uri, 'url': f'{stream.base_url}/{segment.uri}'}
-                    for segment in parsed_stream.segments
-                ],
+    os.makedirs(temp_dir, exist_ok=True)
+    manifest.save(manifest_path)
+
+    manifest_lock = asyncio.Lock()
+
+    def mark_done(segments, only_complete=False):
+        for segment in segments:
+            if only_complete and (
+                not segment.is_complete(temp_dir) or check_segment(os.path.join(temp_dir, segment.filename))
+            ):
+                continue
+            segment.mark_done(temp_dir)
+        manifest.save(manifest_path)
+
+    progress = Progress(ctx.progress_callback)
+    progress.add_total(len(manifest.pending))
+
+    # Segments go through the pipeline in batches, a batch is merged (or remuxed) while the next ones download
+    batches = [manifest.segments[i:i + CHUNK_SEGMENTS] for i in range(0, len(manifest.segments), CHUNK_SEGMENTS)]
+
+    async def download_batch(item):
+        index, batch = item
+        pending = [segment for segment in batch if segment.status != SegmentStatus.DONE]
+
+        if pending:
+            await download_segments(
+                ctx,
+                [{'filename': segment.filename, 'url': segment.url} for segment in pending],
                 temp_dir,
-                proxy
-            ))
-        except DownloaderException as e:
-            shutil.rmtree(temp_dir)
-            return console.error(f'Error: {e}')
+                progress,
+                share,
+                parts * DOWNLOAD_BATCHES
+            )
+
+            async with manifest_lock:
+                await asyncio.to_thread(mark_done, pending)
+
+        return index, [os.path.join(temp_dir, segment.filename) for segment in batch]
+
+    # The merged file (or joined chunks) stays open through the ordered stage, not in append mode: the kernel refuses to
+    # copy_file_range or sendfile into O_APPEND descriptors and append_file would fall back to read/write
+    merge_file = None
+
+    async def merge_batch(item):
+        await asyncio.to_thread(append_files, item[1], merge_file.fileno())
+
+    async def remux_batch(item):
+        index, paths = item
+        chunk_path = os.path.join(temp_dir, f'chunk{index:05d}.mp4')
+
+        if await remux_chunk(paths, chunk_path) != 0:
+            raise DownloaderException('Unable to convert file')
+        return chunk_path
 
-    with console.status(
-        '[white]Merge [info]segments[/info] into [info]ts file',
-        spinner_style='info',
-        spinner='arc'
-    ):
+    # Chunks are appended as soon as the ones before them are, into the output unless a trim pass is still needed
+    chunks_file = os.path.join(temp_dir, 'chunks.mp4') if trim_args else downloaded_file
+    timeline = None
+
+    async def append_batch(chunk_path):
+        nonlocal timeline
+        timeline = await asyncio.to_thread(append_chunk, chunk_path, merge_file.fileno(), timeline)
+        os.unlink(chunk_path)
+
+    # Batches download in any order, only merging and appending remuxed chunks go through them in order
+    stages = [Stage('download', download_batch, DOWNLOAD_BATCHES)]
+
+    if ctx.merge == 'copy':
+        merge_file = open(temp_file, 'wb')
+        stages.append(Stage('merge', merge_batch, ordered=True))
+    elif ctx.merge == 'chunks':
+        merge_file = open(chunks_file, 'wb')
+        stages.append(Stage('remux', remux_batch, REMUX_WORKERS))
+        stages.append(Stage('append', append_batch, ordered=True))
+
+    pipeline = Pipeline(*stages)
+
+    with status(ctx, f'[white]Download [info]{stream.resolution}[/info] ts segments', progress):
         try:
-            with open(temp_file, 'w+b') as f:
-                for segment in parsed_stream.segments:
-                    segment_path = os.path.join(temp_dir, segment.uri)
+            await pipeline.run(enumerate(batches))
+        except BaseException as e:
+            # Keep finished segments so the next run of the same VOD can resume, Ctrl-C included.
+            # The pipeline stopped its stages already, done in place as the run may be cancelled.
+            mark_done(manifest.pending, True)
 
-                    with open(segment_path, 'rb') as ff:
-                        f.write(ff.read())
-        except OSError:
-            shutil.rmtree(temp_dir)
-            return console.error('Error: Unable to merge segments')
-
-    with console.status(
-        '[white]Convert [info]raw ts file[/info] into [info]mp4 file',
-        spinner_style='info',
-        spinner='arc'
-    ):
-        ffmpeg = subprocess.Popen([
-            Binaries.get('ffmpeg'), '-y',
-            '-i', temp_file,
-            '-c', 'copy',
-            '-bsf:a', 'aac_adtstoasc',
-            '-map_metadata', '-1',
-            downloaded_file
-        ], stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            if ctx.merge == 'chunks' and os.path.exists(downloaded_file):
+                merge_file.close()
+                os.unlink(downloaded_file)
 
-        ffmpeg.wait()
-        shutil.rmtree(temp_dir)
+            if isinstance(e, (OSError, ValueError)):
+                raise DownloaderException('Unable to merge segments')
+            raise
+        finally:
+            progress.close()
+
+            if merge_file:
+                merge_file.close()
+
+    report_progress(ctx, progress)
+
+    if ctx.merge == 'chunks':
+        returncode = 0
+
+        if trim_args:
+            with status(ctx, '[white]Trim [info]mp4 file'), pipeline.timings.measure('trim'):
+                returncode = await run_ffmpeg(*trim_args, '-i', chunks_file, '-c', 'copy', '-map_metadata', '-1', downloaded_file)
+    else:
+        if ctx.merge == 'concat':
+            # ffmpeg concat demuxer reads the segments in place, no merged ts file is written
+            concat_list = os.path.join(temp_dir, 'concat.txt')
+            write_concat_list([os.path.join(temp_dir, segment.uri) for segment in segments], concat_list)
+
+            ffmpeg_input = [*trim_args, '-f', 'concat', '-safe', '0', '-i', concat_list]
+        else:
+            ffmpeg_input = [*trim_args, '-i', temp_file]
+
+        with status(ctx, '[white]Convert [info]raw ts file[/info] into [info]mp4 file'), pipeline.timings.measure('convert'):
+            returncode = await run_ffmpeg(
+                *ffmpeg_input,
+                '-c', 'copy',
+                '-bsf:a', 'aac_adtstoasc',
+                '-map_metadata', '-1',
+                downloaded_file
+            )
+
+    shutil.rmtree(temp_dir)
+
+    if returncode != 0:
+        raise DownloaderException('Unable to convert file')
 
-        if ffmpeg.returncode != 0:
-            return console.error('Error: Unable to convert file')
+    if ctx.verbose:
+        console.print(f'Pipeline stages ([info]{pipeline.timings}[/info])', style='white')
 
     console.print(
         'Successfully downloaded '
         f'[info]{vod.title}[/info]'
         f' by '
-        f'[info]{vod.streamer}[/info]',
+        f'[info]{vod.streamer}[/info]'
+        f' in '
+        f'[info]{stream.resolution}[/info]',
         style='white'
     )
 
+    return downloaded_file
+
+
+async def follow_vod(ctx, stream, temp_dir, temp_file, output, share=None, parts=1):
+    # The stream is still live, segments are fetched as they are appended to its playlist
+    segments = follow_playlist(ctx.scheduler.session, stream.url)
+    progress = Progress(ctx.progress_callback)
+
+    if ctx.stream:
+        async def urls():
+            async for new_segments in segments:
+                progress.add_total(len(new_segments))
+
+                for segment in new_segments:
+                    yield f'{stream.base_url}/{segment.uri}'
+
+        with status(ctx, f'[white]Follow [info]{stream.resolution}[/info] live VOD into [info]mp4 file', progress):
+            returncode = await stream_segments(ctx, urls(), output, progress=progress, share=share)
+
+        if returncode != 0:
+            raise DownloaderException('Unable to convert file')
+
+        report_progress(ctx, progress)
+        return
+
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+    os.makedirs(temp_dir)
 
-def download_clip(ctx, clip_id, quality, proxy):
-    with console.status(
-        '[white]Fetching clip data ...',
-        spinner_style='info',
-        spinner='arc'
-    ):
+    with status(ctx, f'[white]Follow [info]{stream.resolution}[/info] live VOD into [info]ts file', progress):
         try:
-            clip = ctx.client.get_clip_data(clip_id)
-        except TwitchException as e:
-            time.sleep(1)
-            return console.error(f'Error: {e}')
+            with open(temp_file, 'wb') as f:
+                async for new_segments in segments:
+                    progress.add_total(len(new_segments))
+                    await download_segments(
+                        ctx,
+                        [{'filename': segment.uri, 'url': f'{stream.base_url}/{segment.uri}'} for segment in new_segments],
+                        temp_dir,
+                        progress,
+                        share,
+                        parts
+                    )
+                    # Appended right away so the segments only stay on disk until the next poll
+                    await asyncio.to_thread(
+                        append_files,
+                        [os.path.join(temp_dir, segment.uri) for segment in new_segments],
+                        f.fileno(),
+                        True
+                    )
+        except (DownloaderException, OSError):
+            shutil.rmtree(temp_dir)
+            raise DownloaderException('Unable to follow stream')
+        finally:
+            progress.close()
+
+    report_progress(ctx, progress)
+
+    with status(ctx, '[white]Convert [info]raw ts file[/info] into [info]mp4 file'):
+        returncode = await run_ffmpeg(
+            '-i', temp_file,
+            '-c', 'copy',
+            '-bsf:a', 'aac_adtstoasc',
+            '-map_metadata', '-1',
+            output
+        )
+
+        shutil.rmtree(temp_dir)
+
+        if returncode != 0:
+            raise DownloaderException('Unable to convert file')
+
+
+async def stream_segments(ctx, urls, output, input_args=(), progress=None, share=None):
+    # Segments are written in playlist order to ffmpeg's stdin, so the VOD never lands on disk as ts
+    ffmpeg = await asyncio.create_subprocess_exec(
+        Binaries.get('ffmpeg'), '-y',
+        *input_args,
+        '-f', 'mpegts',
+        '-i', 'pipe:0',
+        '-c', 'copy',
+        '-bsf:a', 'aac_adtstoasc',
+        '-map_metadata', '-1',
+        output,
+        stdin=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL
+    )
+
+    async def sink(data):
+        ffmpeg.stdin.write(data)
+        await ffmpeg.stdin.drain()
+
+    try:
+        await ctx.scheduler.stream(urls, sink, progress, share)
+    except (DownloaderException, ConnectionError) as e:
+        ffmpeg.kill()
+        await ffmpeg.wait()
+
+        if os.path.exists(output):
+            os.unlink(output)
+
+        if isinstance(e, ConnectionError):
+            raise DownloaderException('Unable to write segments to ffmpeg')
+        raise
+    finally:
+        if progress:
+            progress.close()
+
+    ffmpeg.stdin.close()
+    return await ffmpeg.wait()
+
+
+async def download_clip(ctx, clip_id, quality=None):
+    with status(ctx, '[white]Fetching clip data ...'):
+        clip = await asyncio.to_thread(ctx.client.get_clip_data, clip_id)
 
     console.print(
         f'Starting download of '
@@ -184,23 +694,23 @@ def download_clip(ctx, clip_id, quality, proxy):
         style='white'
     )
 
-    stream = clip.best_stream if not quality else next(filter(
-        lambda s: s.resolution == quality,
-        clip.streams
-    ), None)
+    streams = []
 
-    if not stream:
-        return console.error(f'Error: Unable to find {quality} for this clip')
+    for quality in get_qualities(quality) or [None]:
+        stream = clip.filter_quality(quality)
 
-    temp_dir = os.path.join(DefaultPaths.get_temp_path(), f'{clip.id}.{stream.resolution}')
+        if not stream:
+            raise TwitchException(f'Unable to find {quality} for this clip')
+        streams.append(stream)
 
-    def clean_string(text):
-        return re.sub(r' +', ' ', re.sub(r'[/\\:@?<>"*]+', ' ', text))
+    share = ctx.scheduler.share()
 
-    downloaded_file = os.path.join(
-        DefaultPaths.get_download_path(),
-        f'{clean_string(clip.title)} - {clean_string(clip.streamer)} [{stream.resolution}].mp4'
-    )
+    return await gather_streams([download_clip_stream(ctx, clip, stream, share, len(streams)) for stream in streams])
+
+
+async def download_clip_stream(ctx, clip, stream, share=None, parts=1):
+    temp_dir = os.path.join(DefaultPaths.get_temp_path(), f'{clip.id}.{stream.resolution}')
+    downloaded_file = get_output_path(clip, stream)
 
     if os.path.exists(downloaded_file):
         os.unlink(downloaded_file)
@@ -208,46 +718,56 @@ def download_clip(ctx, clip_id, quality, proxy):
     if os.path.exists(temp_dir):
         shutil.rmtree(temp_dir)
 
-    with console.status(
-        '[white]Download [info]raw clip',
-        spinner_style='info',
-        spinner='arc'
-    ):
-        try:
-            asyncio.run(aria2c.download(
-                [
-                    {'filename': f'{clip.id}.mp4', 'url': stream.url}
-                ],
-                temp_dir,
-                proxy
-            ))
-        except DownloaderException as e:
-            shutil.rmtree(temp_dir)
-            return console.error(f'Error: {e}')
-
-    with console.status(
-        '[white]Convert [info]raw clip file[/info] into [info]clean mp4 file',
-        spinner_style='info',
-        spinner='arc'
-    ):
-        ffmpeg = subprocess.Popen([
-            Binaries.get('ffmpeg'), '-y',
-            '-i', os.path.join(temp_dir, f'{clip.id}.mp4'),
-            '-c', 'copy',
-            '-map_metadata', '-1',
-            downloaded_file
-        ], stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+    progress = Progress(ctx.progress_callback)
+    progress.add_total(1)
+
+    async def download_raw(raw_file):
+        with status(ctx, f'[white]Download [info]{stream.resolution}[/info] raw clip', progress):
+            try:
+                await ctx.scheduler.download(
+                    [
+                        {'filename': os.path.basename(raw_file), 'url': stream.url}
+                    ],
+                    temp_dir,
+                    progress,
+                    share,
+                    parts
+                )
+            finally:
+                progress.close()
+
+        return raw_file
+
+    async def convert(raw_file):
+        with status(ctx, '[white]Convert [info]raw clip file[/info] into [info]clean mp4 file'):
+            returncode = await run_ffmpeg(
+                '-i', raw_file,
+                '-c', 'copy',
+                '-map_metadata', '-1',
+                downloaded_file
+            )
+
+        if returncode != 0:
+            raise DownloaderException('Unable to convert file')
+
+    pipeline = Pipeline(Stage('download', download_raw), Stage('convert', convert))
 
-        ffmpeg.wait()
-        shutil.rmtree(temp_dir)
+    try:
+        await pipeline.run([os.path.join(temp_dir, f'{clip.id}.mp4')])
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
 
-        if ffmpeg.returncode != 0:
-            return console.error('Error: Unable to convert file')
+    if ctx.verbose:
+        console.print(f'Pipeline stages ([info]{pipeline.timings}[/info])', style='white')
 
     console.print(
         'Successfully downloaded '
         f'[info]{clip.title}[/info]'
         f' by '
-        f'[info]{clip.streamer}[/info]',
+        f'[info]{clip.streamer}[/info]'
+        f' in '
+        f'[info]{stream.resolution}[/info]',
         style='white'
     )
+
+    return downloaded_file
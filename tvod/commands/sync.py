@@ -0,0 +1,150 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+import httpx
+
+from tvod.commands import batch, dl
+from tvod.console import console
+from tvod.helpers.downloaders import DOWNLOADERS
+from tvod.helpers.enums.broadcast_type import BroadcastType
+from tvod.helpers.exceptions import TwitchException
+from tvod.helpers.proxy import Proxy
+from tvod.models.vod import VOD
+from tvod.twitch.client import Client
+
+
+@click.command()
+@click.argument('channel')
+@click.option('-p', '--proxy')
+@click.option('-q', '--quality', multiple=True, callback=dl.validate_qualities,
+              help=f'Qualities to download ({",".join(dl.QUALITIES)}), repeatable or comma separated')
+@click.option('-t', '--type', 'broadcast_types', type=click.Choice(BroadcastType.values()), multiple=True,
+              help='Only sync these kinds of videos (repeatable, all by default)')
+@click.option('-f', '--full', is_flag=True, help='Crawl the whole channel instead of stopping at the last synced video')
+@click.option('-d', '--downloader', type=click.Choice(list(DOWNLOADERS)), default='native')
+@click.option('-c', '--concurrency', type=click.IntRange(min=1), default=16, help='Parallel connections shared by all jobs')
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=4, help='Number of VODs downloaded at the same time')
+@click.option('-s', '--stream', is_flag=True, help='Pipe segments into ffmpeg while downloading (native downloader)')
+@click.option('-m', '--merge', type=click.Choice(['copy', 'concat', 'chunks']), default='copy')
+@click.option('-F', '--follow', is_flag=True, help='Keep downloading VODs still live until their stream ends')
+@click.option('-l', '--limit-rate', callback=dl.validate_rate,
+              help='Maximum total download rate in bytes/s (K, M and G suffixes allowed), shared fairly between downloads')
+@click.option('-a', '--adaptive', is_flag=True,
+              help='Adjust parallel connections to the network, up to --concurrency (native and aria2c-rpc downloaders)')
+@click.option('-v', '--verbose', is_flag=True, help='Print timings of each phase')
+@click.pass_context
+def cli(
+    ctx,
+    channel,
+    proxy=None,
+    quality=None,
+    broadcast_types=(),
+    full=False,
+    downloader='native',
+    concurrency=16,
+    jobs=4,
+    stream=False,
+    merge='copy',
+    follow=False,
+    adaptive=False,
+    limit_rate=None,
+    verbose=False
+):
+    """Download the videos of CHANNEL (login or URL) published since the last sync"""
+
+    login = channel.lower()
+
+    if '/' in channel:
+        try:
+            url_type, login = Client.parse_url(channel)
+        except TwitchException as e:
+            return console.error(f'Error: {e}')
+
+        if url_type != 'channel':
+            return console.error('Error: Invalid channel URL provided')
+
+    if proxy:
+        try:
+            proxy = Proxy.from_string(proxy)
+        except ValueError as e:
+            return console.error(f'Error: {e}')
+
+    if adaptive and downloader == 'aria2c':
+        return console.error("Error: --adaptive can't be used with --downloader aria2c, it runs its own connections")
+
+    dl.setup(
+        ctx,
+        proxy,
+        downloader,
+        concurrency,
+        stream,
+        merge,
+        jobs=jobs,
+        follow=follow,
+        adaptive=adaptive,
+        rate_limit=limit_rate,
+        quiet=True,
+        verbose=verbose
+    )
+    broadcast_types = list(broadcast_types) or None
+
+    try:
+        with console.status(f'[white]Crawling [info]{login}[/info] videos ...', spinner_style='info', spinner='arc'):
+            # Newest first, reversed so the oldest missing videos are downloaded first
+            videos = ctx.client.get_channel_videos(login, broadcast_types, not full)[::-1]
+    except TwitchException as e:
+        return console.error(f'Error: {e}')
+
+    if len(videos) < 1:
+        return console.print(f'[info]{login}[/info] is already synced', style='white')
+
+    console.print(f'Found [info]{len(videos)}[/info] new videos on [info]{login}[/info]', style='white')
+
+    with console.status('[white]Fetching VODs data ...', spinner_style='info', spinner='arc'):
+        # Fills the cache with batched requests, each download then reads its VOD from there
+        vods = ctx.client.get_vods_data([video.id for video in videos])
+        live = set() if follow else find_live(ctx.client, videos, vods)
+
+    for video in videos:
+        if video.id in live:
+            console.print(
+                f'Skipping [info]{video.url}[/info]: still live, synced once its stream ended (or use --follow)',
+                style='white'
+            )
+
+    results = asyncio.run(batch.run(ctx, [video.url for video in videos if video.id not in live], quality, jobs))
+    done = {url: error for url, _, error, _ in results}
+
+    # Stop at the oldest failure or live VOD, they are retried by the next sync
+    synced_id = None
+
+    for video in videos:
+        if video.id in live or done.get(video.url):
+            break
+        synced_id = video.id
+
+    if synced_id:
+        ctx.client.mark_channel_synced(login, synced_id, broadcast_types)
+
+    if results:
+        batch.print_summary(results)
+
+
+def find_live(client, videos, vods):
+    # Archives of streams still running have no ENDLIST yet, downloading them now would only get part of them.
+    # The playlists fetched here are cached, the downloads don't request them again.
+    def is_live(video):
+        vod = vods.get(video.id)
+
+        if video.broadcast_type != BroadcastType.ARCHIVE.value or not isinstance(vod, VOD) or not vod.filter_quality():
+            return False
+
+        try:
+            return not client.get_playlist(vod.filter_quality().url).ended
+        except (TwitchException, httpx.HTTPError):
+            # Left to the download, which reports the error
+            return False
+
+    with ThreadPoolExecutor(max_workers=client.BULK_CONCURRENCY) as executor:
+        return {video.id for video, live in zip(videos, executor.map(is_live, videos)) if live}
@@ -0,0 +1,91 @@
+import contextlib
+
+from rich.progress import BarColumn, Progress, ProgressBar, ProgressColumn, SpinnerColumn, TextColumn
+from rich.text import Text
+
+# A download is shown as stalled once nothing was received for this long
+STALLED_AFTER = 10
+
+
+def format_size(size):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} TB'
+
+
+class SegmentsBarColumn(BarColumn):
+    # Drawn from the downloader Progress attached to the row, rows without one only show their spinner
+    def render(self, task):
+        progress = task.fields.get('progress')
+
+        if not progress:
+            return Text('')
+
+        return ProgressBar(
+            total=max(progress.segments_total, 1),
+            completed=progress.segments_done,
+            width=None if self.bar_width is None else max(1, self.bar_width),
+            pulse=progress.segments_total < 1,
+            animation_time=task.get_time(),
+            style=self.style,
+            complete_style=self.complete_style,
+            finished_style=self.finished_style,
+            pulse_style=self.pulse_style
+        )
+
+
+class TransferColumn(ProgressColumn):
+    def render(self, task):
+        progress = task.fields.get('progress')
+
+        if not progress:
+            return Text('')
+
+        text = f'{progress.segments_done}/{progress.segments_total} segments ' \
+               f'{format_size(progress.bytes)} {format_size(progress.rate)}/s'
+
+        if progress.eta is not None:
+            text += f' ETA {int(progress.eta) // 60}:{int(progress.eta) % 60:02d}'
+        if progress.retries:
+            text += f' {progress.retries} retries'
+
+        if progress.stalled_for > STALLED_AFTER and progress.segments_done < progress.segments_total:
+            return Text(f'{text} stalled for {int(progress.stalled_for)}s', style='warn')
+        return Text(text, style='white')
+
+
+class Display:
+    # One live display shared by every step running at the same time (one row each),
+    # rich can't show several spinners or progress bars at once otherwise
+    def __init__(self, console):
+        self.console = console
+        self.live = None
+        self.rows = 0
+
+    @contextlib.contextmanager
+    def row(self, text, progress=None):
+        if self.live is None:
+            self.live = Progress(
+                SpinnerColumn('arc', style='info'),
+                TextColumn('{task.description}'),
+                SegmentsBarColumn(bar_width=30, complete_style='info', finished_style='info'),
+                TransferColumn(),
+                console=self.console,
+                transient=True
+            )
+            self.live.start()
+
+        task_id = self.live.add_task(text, total=None, progress=progress)
+        self.rows += 1
+
+        try:
+            yield
+        finally:
+            self.live.remove_task(task_id)
+            self.rows -= 1
+
+            if self.rows < 1:
+                self.live.stop()
+                self.live = None
@@ -1,4 +1,6 @@
+import importlib.util
 import os
+import re
 from uuid import UUID
 
 project_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../')
@@ -11,3 +13,75 @@ def is_valid_uuid(raw_uuid, version=4):
         except ValueError:
             return False
     return True
+
+
+def atomic_write(path, data, mode='w'):
+    # Write to a temporary file next to `path` then rename it over `path`,
+    # so readers never see a partially written file
+    temp_path = f'{path}.{os.getpid()}.tmp'
+
+    try:
+        with open(temp_path, mode) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+
+def is_http2_available():
+    # HTTP/2 support in httpx needs the optional `h2` package (httpx[http2])
+    return importlib.util.find_spec('h2') is not None
+
+
+def chunks(items, size):
+    items = list(items)
+    for index in range(0, len(items), size):
+        yield items[index:index + size]
+
+
+def parse_timestamp(text):
+    # Accept seconds ("754"), clock times ("12:34", "1:02:03") or units ("1h2m3s")
+    text = text.strip().lower()
+
+    try:
+        if ':' in text:
+            parts = [float(part) for part in text.split(':')]
+            if len(parts) > 3:
+                raise ValueError
+            seconds = sum(part * 60 ** index for index, part in enumerate(reversed(parts)))
+        elif text[-1:] in ['h', 'm', 's']:
+            match = re.fullmatch(r'(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m)?(?:(\d+(?:\.\d+)?)s)?', text)
+            if not match or not any(match.groups()):
+                raise ValueError
+            seconds = sum(float(value or 0) * unit for value, unit in zip(match.groups(), [3600, 60, 1]))
+        else:
+            seconds = float(text)
+    except ValueError:
+        raise ValueError(f'Invalid timestamp: {text}')
+
+    if seconds < 0:
+        raise ValueError(f'Invalid timestamp: {text}')
+    return seconds
+
+
+def format_timestamp(seconds):
+    seconds = int(seconds)
+    return f'{seconds // 3600:02d}h{seconds % 3600 // 60:02d}m{seconds % 60:02d}s'
+
+
+def parse_size(text):
+    # Accept bytes ("500000") or sizes with a binary unit suffix ("500K", "2.5M", "1G")
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)\s*([kmg]?)i?b?', text.strip().lower())
+
+    if not match:
+        raise ValueError(f'Invalid size: {text}')
+
+    size = int(float(match.group(1)) * 1024 ** ' kmg'.index(match.group(2) or ' '))
+
+    # Sizes rounding down to nothing ("0.1") would silently disable what they limit
+    if size < 1:
+        raise ValueError(f'Invalid size: {text}')
+    return size
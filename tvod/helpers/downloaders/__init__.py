@@ -0,0 +1,7 @@
+from tvod.helpers.downloaders import aria2c, aria2c_rpc, native
+
+DOWNLOADERS = {
+    'aria2c': aria2c,
+    'aria2c-rpc': aria2c_rpc,
+    'native': native
+}
@@ -1,6 +1,7 @@
 import asyncio
 import os
 import subprocess
+import uuid
 
 from tvod.helpers.binaries import Binaries
 from tvod.helpers.enums.protocol import Protocol
@@ -8,7 +9,25 @@ from tvod.helpers.exceptions import DownloaderException
 from tvod.helpers.proxy import Proxy
 
 
-async def download(urls, download_path, proxy=None):
+def collect_finished(pending, download_path, progress):
+    # aria2c reports nothing while it runs, finished files are picked up from the download directory
+    with os.scandir(download_path) as entries:
+        files = {entry.name: entry for entry in entries}
+
+    for filename in list(pending):
+        if filename in files and f'{filename}.aria2' not in files:
+            size = files[filename].stat().st_size
+            progress.advance(size)
+            progress.segment_done(pending.pop(filename), size)
+
+
+async def watch(pending, download_path, progress, interval=0.5):
+    while pending:
+        collect_finished(pending, download_path, progress)
+        await asyncio.sleep(interval)
+
+
+async def download(urls, download_path, proxy=None, concurrency=16, progress=None, rate_limit=None):
     if proxy:
         if type(proxy) != Proxy:
             raise ValueError('Invalid proxy provided')
@@ -16,17 +35,18 @@ async def download(urls, download_path, proxy=None):
             # aria2c only support HTTP as proxy protocol
             # use pproxy to bypass this limitation
             async with proxy.get_pproxy() as pproxy:
-                return await download(urls, download_path, pproxy)
+                return await download(urls, download_path, pproxy, concurrency, progress, rate_limit)
 
     try:
-        urls = iter(urls)
+        urls = list(urls)
     except TypeError:
         raise ValueError("Can't iterate urls")
 
     if not os.path.exists(download_path):
         os.makedirs(download_path)
 
-    aria2c_txt_path = os.path.join(download_path, 'aria2c.txt')
+    # Several downloads may run in the same directory, each one gets its own input file
+    aria2c_txt_path = os.path.join(download_path, f'aria2c.{uuid.uuid4().hex}.txt')
     aria2c_txt_content = ''
 
     for url in urls:
@@ -46,9 +66,9 @@ async def download(urls, download_path, proxy=None):
     args = [
         '-c',  # Continue downloading a partially downloaded file
         '--remote-time',  # Retrieve timestamp of the remote file from the and apply if available
-        '-x', '16',  # The maximum number of connections to one server for each download
-        '-j', '16',  # The maximum number of parallel downloads for every static (HTTP/FTP) URL
-        '-s', '16',  # Download a file using N connections
+        '-x', str(concurrency),  # The maximum number of connections to one server for each download
+        '-j', str(concurrency),  # The maximum number of parallel downloads for every static (HTTP/FTP) URL
+        '-s', str(concurrency),  # Download a file using N connections
         '--min-split-size', '20M',  # effectively disable split if segmented
         '--allow-overwrite=true',
         '--auto-file-renaming=false',
@@ -62,6 +82,9 @@ async def download(urls, download_path, proxy=None):
     if proxy:
         args += ["--all-proxy", str(proxy)]
 
+    if rate_limit:
+        args += ['--max-overall-download-limit', str(int(rate_limit))]
+
     proc = await asyncio.create_subprocess_exec(
         Binaries.get('aria2c'),
         *args,
@@ -69,18 +92,38 @@ async def download(urls, download_path, proxy=None):
         stderr=subprocess.DEVNULL
     )
 
-    await proc.wait()
+    pending = {url.get('filename'): url.get('url') for url in urls}
+    watcher = asyncio.create_task(watch(pending, download_path, progress)) if progress else None
+
+    try:
+        await proc.wait()
+    except asyncio.CancelledError:
+        proc.kill()
+        await proc.wait()
+        raise
+    finally:
+        if watcher:
+            watcher.cancel()
+            await asyncio.gather(watcher, return_exceptions=True)
+
+    if progress:
+        # Last pass for the files finished since the previous poll
+        collect_finished(pending, download_path, progress)
 
     os.unlink(aria2c_txt_path)
 
     if proc.returncode != 0:
+        # Drop unfinished files only, finished ones are kept so the download can be resumed
         for url in urls:
             filepath = os.path.join(download_path, url.get('filename'))
 
-            for file in [filepath, f'{filepath}.aria2c']:
+            if not os.path.exists(f'{filepath}.aria2'):
+                continue
+
+            for file in [filepath, f'{filepath}.aria2']:
                 if os.path.exists(file):
                     try:
-                        os.unlink(filepath)
+                        os.unlink(file)
                     except OSError:
                         pass
 
@@ -0,0 +1,290 @@
+import asyncio
+import os
+import secrets
+import socket
+import subprocess
+
+import httpx
+
+from tvod.helpers.binaries import Binaries
+from tvod.helpers.enums.protocol import Protocol
+from tvod.helpers.exceptions import DownloaderException
+from tvod.helpers.proxy import Proxy
+
+STATUS_KEYS = ['gid', 'status', 'completedLength', 'errorMessage']
+
+
+def get_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Aria2Daemon:
+    # One aria2c process driven over JSON-RPC, every download submitted to it shares its connection pool
+    POLL_INTERVAL = 0.5
+    START_TIMEOUT = 10
+
+    def __init__(self, proxy=None, concurrency=16, retries=5, retry_wait=2, limiter=None, rate_limit=None):
+        # With a `limiter` (an AdaptiveLimiter), aria2c's number of parallel downloads follows its limit,
+        # `rate_limit` (bytes/s) caps the bandwidth of the whole daemon
+        if proxy and type(proxy) is not Proxy:
+            raise ValueError('Invalid proxy provided')
+
+        self.proxy = proxy
+        self.concurrency = concurrency
+        self.retries = retries
+        self.retry_wait = retry_wait
+        self.limiter = limiter
+        self.rate_limit = rate_limit
+
+        self.applied_limit = None
+        self.port = None
+        self.secret = None
+        self.process = None
+        self.session = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.port}/jsonrpc'
+
+    async def start(self):
+        self.port = get_free_port()
+        self.secret = secrets.token_hex(16)
+
+        args = [
+            '--enable-rpc',
+            '--rpc-listen-all=false',  # Only reachable from this machine
+            '--rpc-listen-port', str(self.port),
+            '--rpc-secret', self.secret,
+            '--rpc-max-request-size', '64M',
+            '-j', str(self.limiter.limit if self.limiter else self.concurrency),  # The maximum number of parallel downloads
+            '-x', str(self.concurrency),  # The maximum number of connections to one server for each download
+            '--min-split-size', '20M',  # effectively disable split if segmented
+            '--remote-time',
+            '--allow-overwrite=true',
+            '--auto-file-renaming=false',
+            '--retry-wait', str(self.retry_wait),
+            '--max-tries', str(self.retries),
+            '--max-file-not-found', '0',
+            '--max-download-result', '100000',
+            '--summary-interval', '0',
+            '--stop-with-process', str(os.getpid())
+        ]
+
+        if self.proxy:
+            args += ['--all-proxy', str(self.proxy)]
+
+        if self.rate_limit:
+            args += ['--max-overall-download-limit', str(int(self.rate_limit))]
+
+        self.process = await asyncio.create_subprocess_exec(
+            Binaries.get('aria2c'),
+            *args,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        self.session = httpx.AsyncClient(timeout=httpx.Timeout(30, connect=5))
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.START_TIMEOUT
+
+        while True:
+            try:
+                await self.call('aria2.getVersion')
+                return
+            except (httpx.HTTPError, DownloaderException):
+                if self.process.returncode is not None or loop.time() > deadline:
+                    await self.close()
+                    raise DownloaderException('Unable to start aria2c')
+                await asyncio.sleep(0.1)
+
+    async def close(self):
+        if self.process and self.process.returncode is None:
+            try:
+                await self.call('aria2.forceShutdown')
+                await asyncio.wait_for(self.process.wait(), 5)
+            except (httpx.HTTPError, DownloaderException, asyncio.TimeoutError):
+                self.process.kill()
+                await self.process.wait()
+
+        if self.session:
+            await self.session.aclose()
+
+        self.process = None
+        self.session = None
+
+    async def call(self, method, *params):
+        req = await self.session.post(self.url, json={
+            'jsonrpc': '2.0',
+            'id': secrets.token_hex(4),
+            'method': method,
+            'params': [f'token:{self.secret}', *params]
+        })
+        response = req.json()
+
+        if 'error' in response:
+            raise DownloaderException(f'aria2c: {response.get("error").get("message")}')
+        return response.get('result')
+
+    async def multicall(self, calls):
+        # system.multicall takes no token itself, each call carries its own
+        req = await self.session.post(self.url, json={
+            'jsonrpc': '2.0',
+            'id': secrets.token_hex(4),
+            'method': 'system.multicall',
+            'params': [[
+                {'methodName': method, 'params': [f'token:{self.secret}', *params]}
+                for method, *params in calls
+            ]]
+        })
+        response = req.json()
+
+        if 'error' in response:
+            raise DownloaderException(f'aria2c: {response.get("error").get("message")}')
+        return response.get('result')
+
+    async def download(self, urls, download_path, progress=None):
+        try:
+            urls = list(urls)
+        except TypeError:
+            raise ValueError("Can't iterate urls")
+
+        for url in urls:
+            if type(url) is not dict:
+                raise ValueError('Invalid urls provided')
+
+            if 'url' not in url or 'filename' not in url:
+                raise ValueError('Invalid urls provided')
+
+        if not os.path.exists(download_path):
+            os.makedirs(download_path)
+
+        try:
+            results = await self.multicall([
+                ('aria2.addUri', [url.get('url')], {'dir': download_path, 'out': url.get('filename')})
+                for url in urls
+            ])
+        except httpx.HTTPError:
+            raise DownloaderException('Unable to reach aria2c')
+
+        # Failed calls are returned as a fault dict instead of a one item list
+        gids = {}
+        for url, result in zip(urls, results):
+            if type(result) is not list:
+                await self.remove(list(gids), download_path, urls)
+                raise DownloaderException('Unable to submit urls to aria2c')
+            gids[result[0]] = url
+
+        try:
+            await self.wait(gids, progress)
+        except BaseException:
+            await self.remove(list(gids), download_path, urls)
+            raise
+
+    async def apply_limit(self):
+        if not self.limiter or self.limiter.limit == self.applied_limit:
+            return
+
+        await self.call('aria2.changeGlobalOption', {'max-concurrent-downloads': str(self.limiter.limit)})
+        self.applied_limit = self.limiter.limit
+
+    async def wait(self, gids, progress=None):
+        loop = asyncio.get_running_loop()
+        pending = dict(gids)
+        completed = {}
+        started_at = {}
+
+        while pending:
+            try:
+                active, stopped = await self.multicall([
+                    ('aria2.tellActive', STATUS_KEYS),
+                    ('aria2.tellStopped', 0, 100000, STATUS_KEYS)
+                ])
+            except httpx.HTTPError:
+                raise DownloaderException('Unable to reach aria2c')
+
+            finished = []
+
+            for status in active[0] + stopped[0]:
+                gid = status.get('gid')
+
+                if gid not in pending:
+                    continue
+
+                size = int(status.get('completedLength') or 0)
+                started_at.setdefault(gid, loop.time() - self.POLL_INTERVAL / 2)
+
+                if progress and size > completed.get(gid, 0):
+                    progress.advance(size - completed.get(gid, 0))
+                completed[gid] = size
+
+                if status.get('status') == 'complete':
+                    finished.append(gid)
+
+                    if self.limiter:
+                        self.limiter.on_success(loop.time() - started_at.get(gid), size)
+
+                    if progress:
+                        progress.segment_done(pending.get(gid).get('url'), size)
+                    del pending[gid]
+                elif status.get('status') in ['error', 'removed']:
+                    if self.limiter:
+                        self.limiter.on_error()
+                    if progress:
+                        progress.fail(pending.get(gid).get('url'), status.get('errorMessage'))
+                    raise DownloaderException('Unable to download urls')
+
+            if finished:
+                # Keep aria2c's result list small, it is read back on every poll
+                await self.multicall([('aria2.removeDownloadResult', gid) for gid in finished])
+
+            await self.apply_limit()
+
+            if pending:
+                await asyncio.sleep(self.POLL_INTERVAL)
+
+    async def remove(self, gids, download_path, urls):
+        # Cancel whatever is left of a download and drop its unfinished files
+        if self.process and self.process.returncode is None and gids:
+            try:
+                await self.multicall([('aria2.forceRemove', gid) for gid in gids])
+                await asyncio.sleep(self.POLL_INTERVAL)
+                await self.multicall([('aria2.removeDownloadResult', gid) for gid in gids])
+            except (httpx.HTTPError, DownloaderException):
+                pass
+
+        for url in urls:
+            filepath = os.path.join(download_path, url.get('filename'))
+
+            if not os.path.exists(f'{filepath}.aria2'):
+                continue
+
+            for file in [filepath, f'{filepath}.aria2']:
+                if os.path.exists(file):
+                    try:
+                        os.unlink(file)
+                    except OSError:
+                        pass
+
+
+async def download(urls, download_path, proxy=None, concurrency=16, progress=None, rate_limit=None):
+    # Standalone use starts a daemon for this download only, a Scheduler keeps one for the whole run
+    if proxy:
+        if type(proxy) is not Proxy:
+            raise ValueError('Invalid proxy provided')
+        if proxy.proto != Protocol.HTTP:
+            # aria2c only support HTTP as proxy protocol
+            # use pproxy to bypass this limitation
+            async with proxy.get_pproxy() as pproxy:
+                return await download(urls, download_path, pproxy, concurrency, progress, rate_limit)
+
+    async with Aria2Daemon(proxy, concurrency, rate_limit=rate_limit) as daemon:
+        await daemon.download(urls, download_path, progress)
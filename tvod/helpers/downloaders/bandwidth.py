@@ -0,0 +1,79 @@
+import asyncio
+import collections
+import itertools
+import time
+
+
+class RateLimiter:
+    # Token bucket (bytes/s) shared by every download of a run. Each download takes its own share,
+    # shares waiting for bandwidth are served in turn so concurrent jobs progress at the same pace
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError('Invalid rate provided')
+
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+
+        self._ids = itertools.count()
+        self._waiters = collections.defaultdict(collections.deque)
+        self._turns = collections.deque()
+        self._pump = None
+
+    def share(self):
+        return Share(self, next(self._ids))
+
+    async def consume(self, share_id, size):
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[share_id].append((size, future))
+
+        if share_id not in self._turns:
+            self._turns.append(share_id)
+
+        if not self._pump or self._pump.done():
+            self._pump = asyncio.create_task(self._serve())
+
+        await future
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def _serve(self):
+        while self._turns:
+            share_id = self._turns[0]
+            waiters = self._waiters[share_id]
+
+            # Drop requests whose download was cancelled meanwhile
+            while waiters and waiters[0][1].done():
+                waiters.popleft()
+
+            if not waiters:
+                self._turns.popleft()
+                del self._waiters[share_id]
+                continue
+
+            size, future = waiters[0]
+            self._refill()
+
+            # Requests bigger than the bucket are let through once it is full, the debt is paid by the next ones
+            needed = min(size, self.burst)
+            if self.tokens < needed:
+                await asyncio.sleep((needed - self.tokens) / self.rate)
+                continue
+
+            self.tokens -= size
+            waiters.popleft()
+            future.set_result(None)
+            self._turns.rotate(-1)
+
+
+class Share:
+    def __init__(self, limiter, share_id):
+        self.limiter = limiter
+        self.id = share_id
+
+    async def consume(self, size):
+        await self.limiter.consume(self.id, size)
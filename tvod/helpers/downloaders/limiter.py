@@ -0,0 +1,138 @@
+import asyncio
+import collections
+import time
+
+
+class AdaptiveLimiter:
+    # Drop-in replacement of the download semaphore whose limit follows the network (AIMD):
+    # the limit grows while the transfer rate holds, and is halved on errors or when the aggregate rate
+    # of two rounds in a row falls below the best of the last RATE_WINDOW rounds divided by RATE_TOLERANCE.
+    # Rounds measured at a previous limit are forgotten after each decrease.
+    INITIAL_LIMIT = 4
+    DECREASE_FACTOR = 0.5
+    RATE_TOLERANCE = 1.5
+    RATE_WINDOW = 8
+    # A round is at least this many segments, so the jitter of a single one doesn't decide at low limits
+    MIN_ROUND_SAMPLES = 8
+
+    def __init__(self, max_limit=16, min_limit=1, initial_limit=None):
+        self.max_limit = max(max_limit, 1)
+        self.min_limit = min(max(min_limit, 1), self.max_limit)
+        self.limit = min(max(initial_limit or self.INITIAL_LIMIT, self.min_limit), self.max_limit)
+        self.in_flight = 0
+
+        # Limits double each round until the first decrease, then grow one by one
+        self.slow_start = True
+        self.rates = collections.deque(maxlen=self.RATE_WINDOW)
+        self.slow_rounds = 0
+        self.decreases = 0
+        self.lowest = self.limit
+        self.highest = self.limit
+
+        self._round_transfers = []
+        self._round_bytes = 0
+        self._round_decreased = False
+        self._waiters = []
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, *_):
+        self.release()
+
+    async def acquire(self):
+        while self.in_flight >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                self._wake()
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def on_success(self, elapsed, size):
+        now = time.monotonic()
+        self._round_transfers.append((now - elapsed, now))
+        self._round_bytes += size
+
+        if len(self._round_transfers) < max(self.limit, self.MIN_ROUND_SAMPLES):
+            return
+
+        rate = self._round_bytes / max(self._busy_time(), 1e-6)
+        slow = bool(self.rates) and rate < max(self.rates) / self.RATE_TOLERANCE
+        self.rates.append(rate)
+        # Two slow rounds in a row are needed, a single one is often just noise
+        self.slow_rounds = self.slow_rounds + 1 if slow else 0
+
+        if self.slow_rounds >= 2:
+            self.slow_rounds = 0
+            self._decrease()
+            return
+
+        if not slow and not self._round_decreased:
+            self._set_limit(self.limit * 2 if self.slow_start else self.limit + 1)
+
+        self._reset_round()
+
+    def _busy_time(self):
+        # Time during which at least one transfer of the round was running, idle gaps between batches don't count
+        busy = 0
+        end = None
+
+        for started_at, finished_at in sorted(self._round_transfers):
+            if end is None or started_at > end:
+                busy += finished_at - started_at
+                end = finished_at
+            elif finished_at > end:
+                busy += finished_at - end
+                end = finished_at
+
+        return busy
+
+    def on_error(self):
+        # A burst of failures from the same round only cuts the limit once
+        if not self._round_decreased:
+            self._decrease()
+
+    def _decrease(self):
+        self.slow_start = False
+        self.decreases += 1
+        self._set_limit(int(self.limit * self.DECREASE_FACTOR))
+        # The rates measured at the previous limit aren't what the new one should be held to
+        self.rates.clear()
+        self._reset_round()
+        self._round_decreased = True
+
+    def _reset_round(self):
+        self._round_transfers = []
+        self._round_bytes = 0
+        self._round_decreased = False
+
+    def _set_limit(self, limit):
+        self.limit = min(max(limit, self.min_limit), self.max_limit)
+        self.lowest = min(self.lowest, self.limit)
+        self.highest = max(self.highest, self.limit)
+        self._wake()
+
+    def _wake(self):
+        free = self.limit - self.in_flight
+
+        for waiter in self._waiters:
+            if free < 1:
+                break
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def __str__(self):
+        return f'{self.limit} connections (lowest {self.lowest}, highest {self.highest}, {self.decreases} decreases)'
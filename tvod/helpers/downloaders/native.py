@@ -0,0 +1,264 @@
+import asyncio
+import collections
+import contextlib
+import io
+import os
+import time
+
+import httpx
+
+from tvod.helpers import is_http2_available
+from tvod.helpers.downloaders.limiter import AdaptiveLimiter
+from tvod.helpers.enums.protocol import Protocol
+from tvod.helpers.exceptions import DownloaderException
+from tvod.helpers.proxy import Proxy
+
+
+def get_session(proxy=None, concurrency=16, http2=True):
+    return httpx.AsyncClient(
+        proxies=str(proxy) if proxy else None,
+        http2=http2 and is_http2_available(),
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        timeout=httpx.Timeout(30, connect=10),
+        follow_redirects=True
+    )
+
+
+async def fetch(session, url, output, retries=5, retry_wait=2, progress=None, limiter=None, throttle=None):
+    # Write the body of `url` into the `output` file object, starting over on each retry,
+    # `limiter` (an AdaptiveLimiter) is told how long each successful attempt took and about failed ones,
+    # `throttle` (a bandwidth Share) holds the reading back to stay under its rate limit
+    for attempt in range(retries):
+        output.seek(0)
+        output.truncate()
+        started_at = time.monotonic()
+        throttled = 0
+        size = 0
+
+        try:
+            async with session.stream('GET', url) as req:
+                if req.status_code == httpx.codes.NOT_FOUND:
+                    if progress:
+                        progress.fail(url, 'Not found')
+                    raise DownloaderException(f'Unable to find {url}')
+
+                req.raise_for_status()
+
+                async for chunk in req.aiter_bytes():
+                    output.write(chunk)
+                    size += len(chunk)
+
+                    if progress:
+                        progress.advance(len(chunk))
+                    if throttle:
+                        # Time held back by the rate limit isn't the network's, kept out of the limiter's latency
+                        throttled_at = time.monotonic()
+                        await throttle.consume(len(chunk))
+                        throttled += time.monotonic() - throttled_at
+
+                expected_size = req.headers.get('Content-Length')
+                if expected_size and int(expected_size) != size:
+                    raise httpx.ReadError(f'Truncated response for {url}')
+
+            if limiter:
+                limiter.on_success(time.monotonic() - started_at - throttled, size)
+            return size
+        except httpx.HTTPError as e:
+            if progress and size:
+                # Received again by the next attempt, only the attempt that succeeds counts
+                progress.rewind(size)
+            if limiter:
+                limiter.on_error()
+
+            if attempt + 1 >= retries:
+                if progress:
+                    progress.fail(url, e)
+                break
+
+            if progress:
+                progress.retry(url, e)
+            # Exponential backoff between two attempts on the same segment
+            await asyncio.sleep(retry_wait * (2 ** attempt))
+
+    raise DownloaderException(f'Unable to download {url}')
+
+
+async def fetch_file(session, url, filepath, retries=5, retry_wait=2, progress=None, limiter=None, throttle=None):
+    part_path = f'{filepath}.part'
+
+    try:
+        with open(part_path, 'wb') as f:
+            size = await fetch(session, url, f, retries, retry_wait, progress, limiter, throttle)
+        os.replace(part_path, filepath)
+        return size
+    finally:
+        if os.path.exists(part_path):
+            os.unlink(part_path)
+
+
+@contextlib.asynccontextmanager
+async def _open_session(session, proxy, concurrency, http2):
+    # Reuse the pooled session of a scheduler when one is given, it is left open afterwards
+    if session:
+        yield session
+        return
+
+    async with get_session(proxy, concurrency, http2) as session:
+        yield session
+
+
+async def download(
+    urls,
+    download_path,
+    proxy=None,
+    concurrency=16,
+    retries=5,
+    retry_wait=2,
+    http2=True,
+    session=None,
+    semaphore=None,
+    progress=None,
+    rate_limiter=None,
+    share=None
+):
+    # `progress` (a Progress instance) is told about every received chunk and finished, retried or failed segment,
+    # `rate_limiter` (a bandwidth RateLimiter) caps the download rate, this download getting its own share
+    # unless the `share` of the job it belongs to is given
+    if proxy and not session:
+        if type(proxy) is not Proxy:
+            raise ValueError('Invalid proxy provided')
+        if proxy.proto != Protocol.HTTP:
+            # httpx only support HTTP as proxy protocol without extra dependencies
+            # use pproxy to bypass this limitation
+            async with proxy.get_pproxy() as pproxy:
+                return await download(
+                    urls, download_path, pproxy, concurrency, retries, retry_wait, http2, session, semaphore, progress,
+                    rate_limiter, share
+                )
+
+    try:
+        urls = list(urls)
+    except TypeError:
+        raise ValueError("Can't iterate urls")
+
+    for url in urls:
+        if type(url) is not dict:
+            raise ValueError('Invalid urls provided')
+
+        if 'url' not in url or 'filename' not in url:
+            raise ValueError('Invalid urls provided')
+
+    if not os.path.exists(download_path):
+        os.makedirs(download_path)
+
+    semaphore = semaphore or asyncio.Semaphore(concurrency)
+    limiter = semaphore if isinstance(semaphore, AdaptiveLimiter) else None
+    throttle = share or (rate_limiter.share() if rate_limiter else None)
+
+    async def worker(url):
+        async with semaphore:
+            size = await fetch_file(
+                session,
+                url.get('url'),
+                os.path.join(download_path, url.get('filename')),
+                retries,
+                retry_wait,
+                progress,
+                limiter,
+                throttle
+            )
+
+        if progress:
+            progress.segment_done(url.get('url'), size)
+        return size
+
+    async with _open_session(session, proxy, concurrency, http2) as session:
+        tasks = [asyncio.create_task(worker(url)) for url in urls]
+
+        try:
+            await asyncio.gather(*tasks)
+        except DownloaderException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise DownloaderException('Unable to download urls')
+
+
+async def stream(
+    urls,
+    sink,
+    proxy=None,
+    concurrency=16,
+    buffer_size=None,
+    retries=5,
+    retry_wait=2,
+    http2=True,
+    session=None,
+    semaphore=None,
+    progress=None,
+    rate_limiter=None,
+    share=None
+):
+    # Fetch `urls` (an iterable or an async iterable) concurrently but hand their bodies to the `sink` coroutine
+    # in order. At most `buffer_size` segments are held in memory waiting for their turn.
+    if proxy and not session:
+        if type(proxy) is not Proxy:
+            raise ValueError('Invalid proxy provided')
+        if proxy.proto != Protocol.HTTP:
+            async with proxy.get_pproxy() as pproxy:
+                return await stream(
+                    urls, sink, pproxy, concurrency, buffer_size, retries, retry_wait, http2, session, semaphore, progress,
+                    rate_limiter, share
+                )
+
+    if not hasattr(urls, '__aiter__'):
+        try:
+            urls = iter(urls)
+        except TypeError:
+            raise ValueError("Can't iterate urls")
+
+    buffer_size = max(buffer_size or concurrency * 2, 1)
+    semaphore = semaphore or asyncio.Semaphore(concurrency)
+    limiter = semaphore if isinstance(semaphore, AdaptiveLimiter) else None
+    throttle = share or (rate_limiter.share() if rate_limiter else None)
+    pending = collections.deque()
+
+    async def worker(url):
+        async with semaphore:
+            with io.BytesIO() as buffer:
+                size = await fetch(session, url, buffer, retries, retry_wait, progress, limiter, throttle)
+                data = buffer.getvalue()
+
+        if progress:
+            progress.segment_done(url, size)
+        return data
+
+    async def feed(url):
+        if type(url) is not str:
+            raise ValueError('Invalid urls provided')
+
+        # Hand over what is already there, an async source may take a while to yield the next url
+        while pending and pending[0].done():
+            await sink(pending.popleft().result())
+
+        if len(pending) >= buffer_size:
+            await sink(await pending.popleft())
+        pending.append(asyncio.create_task(worker(url)))
+
+    async with _open_session(session, proxy, concurrency, http2) as session:
+        try:
+            if hasattr(urls, '__aiter__'):
+                async for url in urls:
+                    await feed(url)
+            else:
+                for url in urls:
+                    await feed(url)
+
+            while pending:
+                await sink(await pending.popleft())
+        except DownloaderException:
+            raise DownloaderException('Unable to download urls')
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
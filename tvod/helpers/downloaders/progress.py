@@ -0,0 +1,142 @@
+import asyncio
+import collections
+import time
+import urllib.parse
+from typing import Union
+
+from pydantic import BaseModel
+
+from tvod.helpers.enums.progress_event_type import ProgressEventType
+
+
+class ProgressEvent(BaseModel):
+    type: ProgressEventType
+    url: str
+    host: str
+    size: int = 0
+    error: Union[str, None] = None
+    segments_done: int
+    segments_total: int
+    bytes: int
+    rate: float
+    retries: int
+
+
+class Progress:
+    # Collects what a downloader reports about one download, each finished, retried or failed segment
+    # is sent as a ProgressEvent to the callbacks and to the `events()` iterators
+    RATE_WINDOW = 5
+
+    def __init__(self, callback=None):
+        self.segments_total = 0
+        self.segments_done = 0
+        self.bytes = 0
+        self.retries = 0
+        self.errors = collections.Counter()
+        self.started_at = time.monotonic()
+        self.last_activity = self.started_at
+
+        self._samples = collections.deque([(self.started_at, 0)])
+        self._callbacks = [callback] if callback else []
+        self._queues = []
+
+    def subscribe(self, callback):
+        self._callbacks.append(callback)
+
+    async def events(self):
+        # Yield the events sent after the call until close()
+        queue = asyncio.Queue()
+        self._queues.append(queue)
+
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            self._queues.remove(queue)
+
+    def close(self):
+        for queue in self._queues:
+            queue.put_nowait(None)
+
+    def add_total(self, count):
+        self.segments_total += count
+
+    def advance(self, size):
+        now = time.monotonic()
+        self.bytes += size
+        self.last_activity = now
+        self._samples.append((now, self.bytes))
+
+        while len(self._samples) > 2 and now - self._samples[1][0] > self.RATE_WINDOW:
+            self._samples.popleft()
+
+    def rewind(self, size):
+        # Take back the bytes of a failed attempt, they are counted again when received
+        self.bytes -= size
+        self._samples.append((time.monotonic(), self.bytes))
+
+    def segment_done(self, url, size=0):
+        self.segments_done += 1
+        self._emit(ProgressEventType.DONE, url, size)
+
+    def retry(self, url, error=None):
+        self.retries += 1
+        self.errors[urllib.parse.urlparse(url).netloc] += 1
+        self._emit(ProgressEventType.RETRY, url, error=error)
+
+    def fail(self, url, error=None):
+        self.errors[urllib.parse.urlparse(url).netloc] += 1
+        self._emit(ProgressEventType.ERROR, url, error=error)
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    @property
+    def rate(self):
+        # Bytes per second over the last RATE_WINDOW seconds, decays while nothing is received
+        since, size = self._samples[0]
+        return (self.bytes - size) / max(time.monotonic() - since, 1e-3)
+
+    @property
+    def stalled_for(self):
+        return time.monotonic() - self.last_activity
+
+    @property
+    def eta(self):
+        if self.segments_done < 1 or self.segments_total <= self.segments_done:
+            return None
+        return (self.segments_total - self.segments_done) * self.elapsed / self.segments_done
+
+    def _emit(self, event_type, url, size=0, error=None):
+        event = ProgressEvent(**{
+            'type': event_type,
+            'url': url,
+            'host': urllib.parse.urlparse(url).netloc,
+            'size': size,
+            'error': str(error) if error else None,
+            'segments_done': self.segments_done,
+            'segments_total': self.segments_total,
+            'bytes': self.bytes,
+            'rate': self.rate,
+            'retries': self.retries
+        })
+
+        for callback in self._callbacks:
+            callback(event)
+        for queue in self._queues:
+            queue.put_nowait(event)
+
+    def __str__(self):
+        text = f'{self.segments_done} segments, {self.bytes / 1024 / 1024:.1f} MB ' \
+               f'in {self.elapsed:.1f}s ({self.bytes / 1024 / 1024 / max(self.elapsed, 1e-3):.1f} MB/s)'
+
+        if self.retries:
+            text += f', {self.retries} retries'
+        if self.errors:
+            text += ', errors: ' + ', '.join(f'{host} {count}' for host, count in self.errors.most_common())
+
+        return text
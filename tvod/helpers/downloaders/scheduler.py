@@ -0,0 +1,135 @@
+import asyncio
+import contextlib
+
+from tvod.helpers.downloaders import aria2c_rpc, native
+from tvod.helpers.downloaders.bandwidth import RateLimiter
+from tvod.helpers.downloaders.limiter import AdaptiveLimiter
+from tvod.helpers.enums.protocol import Protocol
+from tvod.helpers.proxy import Proxy
+
+
+class Scheduler:
+    # Shares one connection pool and one concurrency limit between all the downloads of a run,
+    # with `adaptive` that limit moves between 1 and `concurrency` depending on how the network copes,
+    # `rate_limit` (bytes/s) caps the bandwidth of the whole run, split fairly between concurrent downloads
+    def __init__(self, downloader=native, proxy=None, concurrency=16, jobs=1, http2=True, adaptive=False, rate_limit=None):
+        if proxy and type(proxy) is not Proxy:
+            raise ValueError('Invalid proxy provided')
+
+        self.downloader = downloader
+        self.proxy = proxy
+        self.concurrency = concurrency
+        self.jobs = jobs
+        self.http2 = http2
+        self.adaptive = adaptive
+        self.rate_limit = rate_limit
+
+        self.limiter = None
+        self.rate_limiter = None
+        self.connections = None
+        self.connections_used = 0
+        self.download_proxy = None
+        self.session = None
+        self.semaphore = None
+        self.daemon = None
+        self.stack = None
+
+    async def __aenter__(self):
+        self.stack = contextlib.AsyncExitStack()
+        self.download_proxy = self.proxy
+
+        if self.proxy and self.proxy.proto != Protocol.HTTP:
+            # Bridge the proxy once for the whole run instead of once per download
+            self.download_proxy = await self.stack.enter_async_context(self.proxy.get_pproxy())
+
+        self.session = await self.stack.enter_async_context(
+            native.get_session(self.download_proxy, self.concurrency, self.http2)
+        )
+        if self.adaptive and self.downloader in [native, aria2c_rpc]:
+            # Other downloaders run their own connections, there is nothing to adjust
+            self.limiter = AdaptiveLimiter(self.concurrency)
+        self.semaphore = self.limiter or asyncio.Semaphore(self.concurrency)
+        self.connections = asyncio.Condition()
+
+        if self.rate_limit:
+            self.rate_limiter = RateLimiter(self.rate_limit)
+
+        if self.downloader is aria2c_rpc:
+            # One aria2c for the whole run, its connections are reused by every download
+            self.daemon = await self.stack.enter_async_context(
+                aria2c_rpc.Aria2Daemon(self.download_proxy, self.concurrency, limiter=self.limiter, rate_limit=self.rate_limit)
+            )
+
+        return self
+
+    async def __aexit__(self, *exc_info):
+        try:
+            await self.stack.__aexit__(*exc_info)
+        finally:
+            self.stack = None
+            self.session = None
+            self.semaphore = None
+            self.connections = None
+            self.rate_limiter = None
+            self.daemon = None
+            self.download_proxy = None
+
+    def share(self):
+        # Bandwidth share of one job, all its downloads draw from it so a job gets the same rate however it splits them
+        return self.rate_limiter.share() if self.rate_limiter else None
+
+    async def download(self, urls, download_path, progress=None, share=None, parts=1):
+        # `parts` downloads of the same job run side by side (qualities, batches), each external downloader gets
+        # its part of the run's connections and waits until they are free, so the run never goes over `concurrency`
+        if self.downloader is native:
+            return await native.download(
+                urls,
+                download_path,
+                self.download_proxy,
+                self.concurrency,
+                http2=self.http2,
+                session=self.session,
+                semaphore=self.semaphore,
+                progress=progress,
+                rate_limiter=self.rate_limiter,
+                share=share
+            )
+
+        if self.daemon:
+            return await self.daemon.download(urls, download_path, progress)
+
+        # External downloaders manage their own connections and bandwidth, split the global limits between them
+        connections = max(1, self.concurrency // (self.jobs * parts))
+
+        async with self.connections:
+            await self.connections.wait_for(lambda: self.connections_used + connections <= self.concurrency)
+            self.connections_used += connections
+
+        try:
+            return await self.downloader.download(
+                urls,
+                download_path,
+                self.download_proxy,
+                concurrency=connections,
+                progress=progress,
+                # The rate goes with the connections, the processes running at once never add up to more than `rate_limit`
+                rate_limit=max(1, self.rate_limit * connections // self.concurrency) if self.rate_limit else None
+            )
+        finally:
+            async with self.connections:
+                self.connections_used -= connections
+                self.connections.notify_all()
+
+    async def stream(self, urls, sink, progress=None, share=None):
+        return await native.stream(
+            urls,
+            sink,
+            self.download_proxy,
+            self.concurrency,
+            http2=self.http2,
+            session=self.session,
+            semaphore=self.semaphore,
+            progress=progress,
+            rate_limiter=self.rate_limiter,
+            share=share
+        )
@@ -0,0 +1,7 @@
+from tvod.helpers.enums.enum import CustomEnum
+
+
+class BroadcastType(CustomEnum):
+    ARCHIVE = 'archive'
+    HIGHLIGHT = 'highlight'
+    UPLOAD = 'upload'
@@ -0,0 +1,7 @@
+from tvod.helpers.enums.enum import CustomEnum
+
+
+class ProgressEventType(CustomEnum):
+    DONE = 'done'
+    RETRY = 'retry'
+    ERROR = 'error'
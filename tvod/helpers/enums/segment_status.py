@@ -0,0 +1,6 @@
+from tvod.helpers.enums.enum import CustomEnum
+
+
+class SegmentStatus(CustomEnum):
+    PENDING = 'pending'
+    DONE = 'done'
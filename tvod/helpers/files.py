@@ -0,0 +1,129 @@
+import concurrent.futures
+import errno
+import os
+
+CHUNK_SIZE = 1024 * 1024
+
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = 0x47
+TS_CHUNK_SIZE = TS_PACKET_SIZE * 5000
+
+# Errors meaning the kernel can't copy between these two files, try the next method
+_UNSUPPORTED_ERRNOS = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.ENOTSUP}
+
+
+def _copy_file_range(src_fd, dst_fd, offset, size):
+    while offset < size:
+        copied = os.copy_file_range(src_fd, dst_fd, size - offset, offset)
+        if copied == 0:
+            break
+        offset += copied
+    return offset
+
+
+def _sendfile(src_fd, dst_fd, offset, size):
+    while offset < size:
+        copied = os.sendfile(dst_fd, src_fd, offset, min(size - offset, 0x7ffff000))
+        if copied == 0:
+            break
+        offset += copied
+    return offset
+
+
+def _read_write(src_fd, dst_fd, offset, size):
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    while offset < size:
+        chunk = os.read(src_fd, min(CHUNK_SIZE, size - offset))
+        if not chunk:
+            break
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(dst_fd, view):]
+        offset += len(chunk)
+    return offset
+
+
+def append_file(src_fd, dst_fd, offset=0):
+    # Append the `src_fd` file from `offset` to its end at the current position of `dst_fd`,
+    # letting the kernel copy the data when possible
+    size = os.fstat(src_fd).st_size
+    start = os.lseek(dst_fd, 0, os.SEEK_CUR) - offset
+
+    for method, available in [
+        (_copy_file_range, hasattr(os, 'copy_file_range')),
+        (_sendfile, hasattr(os, 'sendfile')),
+        (_read_write, True)
+    ]:
+        if not available:
+            continue
+
+        try:
+            offset = method(src_fd, dst_fd, offset, size)
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+            # A method may fail after copying part of the file, the next one resumes from there
+            offset = os.lseek(dst_fd, 0, os.SEEK_CUR) - start
+            continue
+
+        if offset >= size:
+            break
+
+    return offset
+
+
+def append_files(paths, dst_fd, remove=False):
+    total = 0
+
+    for path in paths:
+        src_fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            total += append_file(src_fd, dst_fd)
+        finally:
+            os.close(src_fd)
+
+        if remove:
+            os.unlink(path)
+
+    return total
+
+
+def concat_files(paths, output_path):
+    dst_fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+
+    try:
+        return append_files(paths, dst_fd)
+    finally:
+        os.close(dst_fd)
+
+
+def check_segment(path):
+    # Return why `path` can't be merged as a segment, None if it looks fine.
+    # MPEG-TS segments are made of 188 bytes packets all starting with the sync byte,
+    # a truncated file or an error page served in place of the segment breaks that
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return 'missing'
+
+    if size == 0:
+        return 'empty'
+
+    if not path.endswith('.ts'):
+        return None
+
+    if size % TS_PACKET_SIZE:
+        return f'truncated ({size} bytes)'
+
+    with open(path, 'rb') as f:
+        while chunk := f.read(TS_CHUNK_SIZE):
+            if chunk[::TS_PACKET_SIZE].count(TS_SYNC_BYTE) != len(chunk) // TS_PACKET_SIZE:
+                return 'not a MPEG-TS segment'
+
+    return None
+
+
+def find_corrupted(paths, workers=None):
+    # Check `paths` in parallel, return {path: reason} for the ones failing check_segment
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        return {path: reason for path, reason in zip(paths, executor.map(check_segment, paths)) if reason}
@@ -0,0 +1,70 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    # Inter-process exclusive lock held on a sidecar `.lock` file. Threads of one process share the instance,
+    # they queue on a thread lock first: a second descriptor of the same file would block on flock forever.
+    # Reentrant, only the outermost acquire and release touch the file.
+    def __init__(self, path):
+        self.path = f'{path}.lock'
+        self.fd = None
+        self.depth = 0
+        self.thread_lock = threading.RLock()
+
+    def acquire(self):
+        self.thread_lock.acquire()
+
+        if self.depth:
+            self.depth += 1
+            return
+
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+
+            try:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                else:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            except BaseException:
+                os.close(fd)
+                raise
+        except BaseException:
+            self.thread_lock.release()
+            raise
+
+        self.fd = fd
+        self.depth = 1
+
+    def release(self):
+        if not self.depth:
+            return
+
+        try:
+            self.depth -= 1
+
+            if not self.depth:
+                try:
+                    if fcntl:
+                        fcntl.flock(self.fd, fcntl.LOCK_UN)
+                    else:
+                        msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+                finally:
+                    os.close(self.fd)
+                    self.fd = None
+        finally:
+            self.thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *_):
+        self.release()
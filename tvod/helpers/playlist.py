@@ -0,0 +1,111 @@
+import asyncio
+import re
+import time
+from typing import NamedTuple, Tuple, Union
+
+import httpx
+
+from tvod.helpers.exceptions import DownloaderException
+
+TARGET_DURATION_REGEX = re.compile(r'^#EXT-X-TARGETDURATION:(\d+)', re.MULTILINE)
+
+
+class PlaylistSegment(NamedTuple):
+    uri: str
+    duration: float = 0
+    # (length, offset) in bytes when the segment is a sub-range of `uri`
+    byte_range: Union[Tuple[int, int], None] = None
+
+
+def iter_media_playlist(lines):
+    # Yield one PlaylistSegment per segment of an HLS media playlist (a string or an iterable of lines),
+    # only the tags needed to download the segments are read, much faster than building m3u8 objects
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+
+    duration = 0
+    byte_range = None
+    next_offset = 0
+
+    for line in lines:
+        line = line.strip()
+
+        if not line:
+            continue
+
+        if line[0] != '#':
+            yield PlaylistSegment(line, duration, byte_range)
+            duration = 0
+            byte_range = None
+        elif line.startswith('#EXTINF:'):
+            duration = float(line[8:].split(',', 1)[0] or 0)
+        elif line.startswith('#EXT-X-BYTERANGE:'):
+            # Without an offset the sub-range starts where the previous one ended
+            length, _, offset = line[17:].partition('@')
+            offset = int(offset) if offset else next_offset
+            byte_range = (int(length), offset)
+            next_offset = offset + int(length)
+
+
+def parse_media_playlist(text):
+    # Return the segments of a media playlist, whether it ended and its target duration
+    target_duration = TARGET_DURATION_REGEX.search(text)
+
+    return (
+        list(iter_media_playlist(text)),
+        '#EXT-X-ENDLIST' in text,
+        int(target_duration.group(1)) if target_duration else None
+    )
+
+
+async def follow_playlist(session, url, retries=5, idle_timeout=1800):
+    # Poll a growing media playlist on its target duration and yield the segments appended since the previous poll,
+    # stops once #EXT-X-ENDLIST shows up or when nothing new appeared for `idle_timeout` seconds
+    seen = set()
+    errors = 0
+    last_change = time.monotonic()
+
+    while True:
+        try:
+            req = await session.get(url)
+            req.raise_for_status()
+        except httpx.HTTPError:
+            errors += 1
+            if errors >= retries:
+                raise DownloaderException('Unable to fetch stream')
+            await asyncio.sleep(2 ** errors)
+            continue
+
+        errors = 0
+        segments, ended, target_duration = parse_media_playlist(req.text)
+        segments = [segment for segment in segments if segment.uri not in seen]
+
+        if segments:
+            seen.update(segment.uri for segment in segments)
+            last_change = time.monotonic()
+            yield segments
+
+        if ended or time.monotonic() - last_change > idle_timeout:
+            return
+
+        await asyncio.sleep(target_duration or 10)
+
+
+def select_segments(segments, start=None, end=None):
+    # Keep the segments overlapping the [start, end) window (in seconds),
+    # also return where `start` falls in the first kept segment
+    selected = []
+    offset = 0
+    position = 0
+
+    for segment in segments:
+        duration = segment.duration or 0
+
+        if (start is None or position + duration > start) and (end is None or position < end):
+            if not selected and start:
+                offset = start - position
+            selected.append(segment)
+
+        position += duration
+
+    return selected, offset
@@ -1,5 +1,5 @@
 import re
-from contextlib import contextmanager
+from contextlib import asynccontextmanager
 from typing import Union
 
 import pproxy
@@ -54,7 +54,7 @@ class Proxy(BaseModel):
             password=parsed.get('password')
         )
 
-    @contextmanager
+    @asynccontextmanager
     async def get_pproxy(self):
         server = pproxy.Server('http://localhost:0')
         remote = pproxy.Connection(str(self))
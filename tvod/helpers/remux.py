@@ -0,0 +1,182 @@
+import asyncio
+import os
+import struct
+import subprocess
+
+from tvod.helpers.binaries import Binaries
+from tvod.helpers.files import append_file
+
+CHUNK_SEGMENTS = 60
+REMUX_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+# MPEG-TS timestamps are 33 bits at 90 kHz, they wrap after about 26.5 hours
+TS_WRAP = 2 ** 33 / 90000
+_CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'moof', b'traf'}
+
+
+async def run_ffmpeg(*args):
+    ffmpeg = await asyncio.create_subprocess_exec(
+        Binaries.get('ffmpeg'), '-y',
+        *args,
+        stderr=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL
+    )
+
+    try:
+        return await ffmpeg.wait()
+    except asyncio.CancelledError:
+        ffmpeg.kill()
+        await ffmpeg.wait()
+        raise
+
+
+def write_concat_list(paths, list_path):
+    # Input file of ffmpeg's concat demuxer, the files are read in place
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in paths:
+            escaped_path = path.replace("'", "'\\''")
+            f.write(f"file '{escaped_path}'\n")
+
+
+async def remux_chunk(paths, output):
+    # Remux consecutive ts segments into one fragmented mp4 chunk keeping their timestamps (the concat protocol reads
+    # them as one stream, unlike the concat demuxer which starts each chunk at 0), so chunks can be joined end to end
+    return await run_ffmpeg(
+        '-copyts',
+        '-i', f'concat:{"|".join(paths)}',
+        '-c', 'copy',
+        '-bsf:a', 'aac_adtstoasc',
+        '-map_metadata', '-1',
+        '-avoid_negative_ts', 'disabled',
+        '-use_editlist', '0',
+        # No mfra index at the end, its offsets would only be valid in the chunk
+        '-movflags', '+frag_keyframe+empty_moov+default_base_moof+frag_discont+skip_trailer',
+        '-f', 'mp4',
+        output
+    )
+
+
+def _iter_boxes(f, start, end):
+    # Yield (type, offset, header size, size) of the ISO BMFF boxes between `start` and `end`
+    offset = start
+
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, box_type = struct.unpack('>I4s', f.read(8))
+        header_size = 8
+
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+
+        if size < header_size:
+            raise ValueError(f'Invalid mp4 box in {f.name}')
+
+        yield box_type, offset, header_size, size
+        offset += size
+
+
+def _walk_boxes(f, start, end):
+    for box_type, offset, header_size, size in _iter_boxes(f, start, end):
+        yield box_type, offset, header_size, size
+
+        if box_type in _CONTAINER_BOXES:
+            yield from _walk_boxes(f, offset + header_size, offset + size)
+
+
+def _read_full_box(f, offset, header_size, fields):
+    # Version of a full box and the first of its `fields` (struct formats for version 0 and 1)
+    f.seek(offset + header_size)
+    version = f.read(4)[0]
+    field = fields[min(version, 1)]
+    return version, struct.unpack(f'>{field}', f.read(struct.calcsize(field)))[0]
+
+
+def read_fragmented(path):
+    # Return the size of the init segment (ftyp and moov) of a fragmented mp4, where its fragments end (before an
+    # mfra index left by an ffmpeg without skip_trailer), the timescale of each track and the decode time its
+    # first fragment starts at
+    end = os.path.getsize(path)
+    init_size = None
+    timescales = {}
+    starts = {}
+    track_id = None
+
+    with open(path, 'rb') as f:
+        for box_type, offset, header_size, size in _walk_boxes(f, 0, end):
+            if box_type in [b'tkhd', b'tfhd']:
+                version, _ = _read_full_box(f, offset, header_size, ['I', 'I'])
+                # tkhd has two creation/modification times before the track id, tfhd nothing
+                skip = (16 if version else 8) if box_type == b'tkhd' else 0
+                f.seek(offset + header_size + 4 + skip)
+                track_id = struct.unpack('>I', f.read(4))[0]
+            elif box_type == b'mdhd':
+                version, _ = _read_full_box(f, offset, header_size, ['I', 'Q'])
+                f.seek(offset + header_size + (20 if version else 12))
+                timescales[track_id] = struct.unpack('>I', f.read(4))[0]
+            elif box_type == b'moov':
+                init_size = offset + size
+            elif box_type == b'tfdt':
+                starts.setdefault(track_id, _read_full_box(f, offset, header_size, ['I', 'Q'])[1])
+            elif box_type == b'mfra':
+                end = offset
+                break
+
+    if init_size is None or not timescales:
+        raise ValueError(f'{path} is not a fragmented mp4')
+
+    starts = {track: starts.get(track, 0) / timescale for track, timescale in timescales.items()}
+    return init_size, end, timescales, starts
+
+
+def rebase_fragments(path, init_size, end, timescales, shift, sequence):
+    # Move the decode time of every fragment of `path` by `shift` seconds and number them from `sequence`,
+    # in place, return the sequence number of the next fragment
+    with open(path, 'r+b') as f:
+        for box_type, offset, header_size, _ in _walk_boxes(f, init_size, end):
+            if box_type == b'mfhd':
+                f.seek(offset + header_size + 4)
+                f.write(struct.pack('>I', sequence))
+                sequence += 1
+            elif box_type == b'tfhd':
+                f.seek(offset + header_size + 4)
+                track_id = struct.unpack('>I', f.read(4))[0]
+            elif box_type == b'tfdt':
+                version, value = _read_full_box(f, offset, header_size, ['I', 'Q'])
+                f.seek(offset + header_size + 4)
+                f.write(struct.pack('>Q' if version else '>I', max(0, value + round(shift * timescales[track_id]))))
+
+    return sequence
+
+
+def append_chunk(path, dst_fd, timeline=None):
+    # Append a fragmented mp4 chunk made by remux_chunk to the file being built in `dst_fd`. The first chunk brings
+    # the init segment and sets the `timeline` returned, the following ones only add their fragments: chunks of one
+    # VOD share their init segment and their timestamps already follow each other. The VOD is moved to start at 0
+    # and its fragments are numbered across chunks.
+    init_size, end, timescales, starts = read_fragmented(path)
+    start = min(starts.values())
+    offset = init_size
+
+    if timeline is None:
+        timeline = {'previous': start, 'shift': -start, 'sequence': 1}
+        offset = 0
+    elif start < timeline.get('previous'):
+        # The chunk was remuxed by another ffmpeg after the timestamps wrapped
+        timeline['shift'] += TS_WRAP
+
+    timeline['previous'] = start
+    timeline['sequence'] = rebase_fragments(path, init_size, end, timescales, timeline.get('shift'), timeline.get('sequence'))
+
+    if end < os.path.getsize(path):
+        os.truncate(path, end)
+
+    src_fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        append_file(src_fd, dst_fd, offset)
+    finally:
+        os.close(src_fd)
+
+    return timeline
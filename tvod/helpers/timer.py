@@ -0,0 +1,27 @@
+import time
+from contextlib import contextmanager
+
+
+class Timings(dict):
+    # Accumulates elapsed seconds per named phase. Measures of the same phase running at the same time
+    # (workers of a pipeline stage, concurrent requests) count once: the phase gets the time at least one was running
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.running = {}
+        self.started = {}
+
+    @contextmanager
+    def measure(self, name):
+        if not self.running.get(name):
+            self.started[name] = time.perf_counter()
+        self.running[name] = self.running.get(name, 0) + 1
+
+        try:
+            yield
+        finally:
+            self.running[name] -= 1
+            if not self.running[name]:
+                self[name] = self.get(name, 0) + time.perf_counter() - self.started.pop(name)
+
+    def __str__(self):
+        return ', '.join(f'{name} {elapsed:.2f}s' for name, elapsed in self.items())
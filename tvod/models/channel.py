@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+
+from tvod.constants import TWITCH_URL
+
+
+class ChannelVideo(BaseModel):
+    id: str
+    title: str
+    broadcast_type: str
+    created_at: str
+
+    @property
+    def url(self):
+        return f'{TWITCH_URL}/videos/{self.id}'
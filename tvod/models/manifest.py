@@ -0,0 +1,95 @@
+import json
+import os
+import zlib
+from typing import List, Union
+
+from pydantic import BaseModel
+
+from tvod.helpers import atomic_write
+from tvod.helpers.enums.segment_status import SegmentStatus
+from tvod.helpers.files import check_segment
+
+
+def checksum(path):
+    value = 0
+    with open(path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            value = zlib.crc32(chunk, value)
+    return f'{value:08x}'
+
+
+class ManifestSegment(BaseModel):
+    filename: str
+    url: str
+    status: SegmentStatus = SegmentStatus.PENDING
+    size: Union[int, None] = None
+    checksum: Union[str, None] = None
+
+    def is_complete(self, directory):
+        # A file is complete once no downloader control or part file remains next to it
+        path = os.path.join(directory, self.filename)
+        return os.path.exists(path) and not any(
+            os.path.exists(f'{path}{extension}') for extension in ['.aria2', '.part']
+        )
+
+    def mark_done(self, directory):
+        path = os.path.join(directory, self.filename)
+        self.status = SegmentStatus.DONE
+        self.size = os.path.getsize(path)
+        self.checksum = checksum(path)
+
+    def is_valid(self, directory):
+        path = os.path.join(directory, self.filename)
+        return self.status == SegmentStatus.DONE \
+            and self.is_complete(directory) \
+            and os.path.getsize(path) == self.size \
+            and checksum(path) == self.checksum
+
+
+class Manifest(BaseModel):
+    id: str
+    resolution: str
+    playlist: str
+    segments: List[ManifestSegment]
+
+    @staticmethod
+    def load(path):
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return Manifest(**json.load(f))
+        except ValueError:
+            return None
+
+    def save(self, path):
+        atomic_write(path, self.model_dump_json())
+
+    def merge(self, previous, directory):
+        # Carry over segments already downloaded by `previous` that are still intact on disk,
+        # and the ones a killed run finished without getting to record them
+        if not previous or previous.id != self.id or previous.resolution != self.resolution:
+            return []
+
+        previous_segments = {segment.filename: segment for segment in previous.segments}
+        reused = []
+
+        for segment in self.segments:
+            previous_segment = previous_segments.get(segment.filename)
+
+            if previous_segment and previous_segment.is_valid(directory):
+                segment.status = SegmentStatus.DONE
+                segment.size = previous_segment.size
+                segment.checksum = previous_segment.checksum
+                reused.append(segment)
+            elif previous_segment and previous_segment.status != SegmentStatus.DONE \
+                    and segment.is_complete(directory) and not check_segment(os.path.join(directory, segment.filename)):
+                segment.mark_done(directory)
+                reused.append(segment)
+
+        return reused
+
+    @property
+    def pending(self):
+        return [segment for segment in self.segments if segment.status != SegmentStatus.DONE]
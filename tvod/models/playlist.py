@@ -0,0 +1,37 @@
+import time
+from typing import List, Union
+
+from pydantic import BaseModel
+
+from tvod.helpers.playlist import PlaylistSegment, parse_media_playlist
+
+
+class MediaPlaylist(BaseModel):
+    # What is needed from a parsed HLS media playlist, cached by the clients,
+    # `etag` and `last_modified` are used to revalidate it, `checked` is when it was last fetched or revalidated
+    url: str
+    text: str
+    ended: bool = False
+    segments: List[PlaylistSegment]
+    etag: Union[str, None] = None
+    last_modified: Union[str, None] = None
+    checked: float = 0
+
+    def __setstate__(self, state):
+        # Cached before `checked` existed, it is revalidated on its next use
+        state.get('__dict__', {}).setdefault('checked', 0)
+        super().__setstate__(state)
+
+    @staticmethod
+    def parse(url, text, etag=None, last_modified=None):
+        segments, ended, _ = parse_media_playlist(text)
+
+        return MediaPlaylist(
+            url=url,
+            text=text,
+            ended=ended,
+            segments=segments,
+            etag=etag,
+            last_modified=last_modified,
+            checked=time.time()
+        )
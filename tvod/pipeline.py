@@ -0,0 +1,102 @@
+import asyncio
+
+from tvod.helpers.timer import Timings
+
+_END = object()
+
+
+class Stage:
+    # One step of a Pipeline: `func` is a coroutine function called with each item, what it returns is handed
+    # to the next stage. `workers` items are processed at once, an `ordered` stage gets the items in the order
+    # they were fed to the pipeline (and runs one at a time)
+    def __init__(self, name, func, workers=1, ordered=False):
+        self.name = name
+        self.func = func
+        self.workers = 1 if ordered else max(workers, 1)
+        self.ordered = ordered
+
+
+class Pipeline:
+    # Runs items through its stages concurrently, e.g. the segments of a VOD are merged while the next ones
+    # are still downloading. Stages are connected by queues of `queue_size` items, so a fast stage waits for
+    # the slower one after it instead of piling up work. `timings` gets the wall time each stage was busy,
+    # with at least one of its workers on an item.
+    def __init__(self, *stages, queue_size=2):
+        if not stages:
+            raise ValueError('A pipeline needs at least one stage')
+
+        self.stages = stages
+        self.queue_size = queue_size
+        self.timings = Timings()
+
+    async def run(self, items):
+        # Feed `items` (an iterable or an async iterable) through the stages,
+        # return what the last stage returned for each of them, in feeding order
+        queues = [asyncio.Queue(self.queue_size) for _ in self.stages]
+        running = [stage.workers for stage in self.stages]
+        results = {}
+
+        async def feed():
+            index = 0
+
+            if hasattr(items, '__aiter__'):
+                async for item in items:
+                    await queues[0].put((index, item))
+                    index += 1
+            else:
+                for item in items:
+                    await queues[0].put((index, item))
+                    index += 1
+
+            for _ in range(self.stages[0].workers):
+                await queues[0].put(_END)
+
+        async def process(position, index, item):
+            stage = self.stages[position]
+
+            with self.timings.measure(stage.name):
+                result = await stage.func(item)
+
+            if position + 1 < len(self.stages):
+                await queues[position + 1].put((index, result))
+            else:
+                results[index] = result
+
+        async def work(position):
+            stage = self.stages[position]
+            queue = queues[position]
+            waiting = {}
+            next_index = 0
+
+            while (entry := await queue.get()) is not _END:
+                if not stage.ordered:
+                    await process(position, *entry)
+                    continue
+
+                # Hold items arriving early until the ones before them went through
+                waiting[entry[0]] = entry[1]
+                while next_index in waiting:
+                    await process(position, next_index, waiting.pop(next_index))
+                    next_index += 1
+
+            # The last worker of a stage to finish tells the next stage there is nothing left
+            running[position] -= 1
+            if not running[position] and position + 1 < len(self.stages):
+                for _ in range(self.stages[position + 1].workers):
+                    await queues[position + 1].put(_END)
+
+        tasks = [asyncio.create_task(feed())] + [
+            asyncio.create_task(work(position))
+            for position, stage in enumerate(self.stages)
+            for _ in range(stage.workers)
+        ]
+
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        return [results[index] for index in sorted(results)]
@@ -0,0 +1,197 @@
+import asyncio
+
+import httpx
+
+from tvod.cacher import SQLiteBackend
+from tvod.helpers import chunks
+from tvod.helpers.exceptions import TwitchException
+from tvod.helpers.timer import Timings
+from tvod.models.vod import Stream
+from tvod.twitch.async_session import AsyncSession
+from tvod.twitch.client import BaseClient
+
+
+class AsyncClient(BaseClient):
+    def __init__(
+        self,
+        cache_path=None,
+        proxy=None,
+        cache_backend=SQLiteBackend,
+        cache_max_entries=None,
+        cache_max_bytes=None,
+        concurrency=16,
+        http2=True
+    ):
+        super().__init__(cache_path, proxy, cache_backend, cache_max_entries, cache_max_bytes)
+        self.session = AsyncSession(self, concurrency, http2)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+    async def close(self):
+        await self.session.close()
+
+    async def get_vod_data(self, vod_id, from_cache=True, quality=None, timings=None):
+        if type(vod_id) is not str or len(vod_id) < 1:
+            raise TwitchException('Invalid VOD id')
+
+        timings = Timings() if timings is None else timings
+        cache_keys = self.get_vod_cache_keys(vod_id, quality)
+
+        if from_cache:
+            for cache_key in cache_keys:
+                track = self.get_cached(cache_key)
+
+                if track:
+                    return track
+
+        with timings.measure('gql'):
+            responses = await self.session.create_request(self.get_vod_queries(vod_id))
+
+        return await self.resolve_vod(vod_id, responses, quality, timings)
+
+    async def get_vods_data(self, vod_ids, from_cache=True, batch_size=None):
+        results, to_fetch = self.split_cached(vod_ids, 'vod', from_cache)
+        semaphore = asyncio.Semaphore(self.BULK_CONCURRENCY)
+
+        async def resolve(vod_id, responses):
+            async with semaphore:
+                try:
+                    return await self.resolve_vod(vod_id, responses)
+                except (TwitchException, httpx.HTTPError) as e:
+                    return e
+
+        async def fetch_batch(batch):
+            try:
+                responses = await self.session.create_request([
+                    query for vod_id in batch for query in self.get_vod_queries(vod_id)
+                ])
+            except (TwitchException, httpx.HTTPError) as e:
+                return {vod_id: e for vod_id in batch}
+
+            return dict(zip(batch, await asyncio.gather(*[
+                resolve(vod_id, responses[index * 2:index * 2 + 2])
+                for index, vod_id in enumerate(batch)
+            ])))
+
+        for batch_results in await asyncio.gather(*[
+            fetch_batch(batch) for batch in chunks(to_fetch, batch_size or self.BULK_BATCH_SIZE)
+        ]):
+            results.update(batch_results)
+
+        return results
+
+    async def resolve_vod(self, vod_id, responses, quality=None, timings=None):
+        timings = Timings() if timings is None else timings
+        video_playback, vod = self.parse_vod_response(vod_id, *responses)
+
+        usher_url, usher_params = self.get_usher_request(vod_id, video_playback)
+
+        with timings.measure('usher'):
+            req = await self.session.get_session().get(usher_url, params=usher_params)
+
+        if req.status_code == httpx.codes.OK:
+            return self.build_vod(vod_id, vod, self.parse_usher_playlist(req.text))
+        elif req.status_code != httpx.codes.FORBIDDEN:
+            raise TwitchException('Unable to fetch VOD data')
+
+        with timings.measure('probes'):
+            streams = await self.probe_streams(
+                self.filter_restricted_urls(self.get_restricted_urls(vod_id, vod), quality)
+            )
+
+        return self.build_vod(vod_id, vod, streams, self.get_vod_cache_keys(vod_id, quality)[-1])
+
+    async def probe_streams(self, urls):
+        known, urls = self.split_probed(urls)
+        semaphore = asyncio.Semaphore(self.PROBE_CONCURRENCY)
+
+        async def probe(url):
+            async with semaphore:
+                req = await self.session.get_session().get(url)
+
+            if req.status_code != httpx.codes.OK:
+                return False
+
+            self.parse_playlist_response(url, req)
+            return True
+
+        found = await asyncio.gather(*[probe(url) for _, url in urls])
+
+        return [
+            Stream(**{
+                **quality,
+                'url': url
+            })
+            for (quality, url), ok in zip(known + urls, [True] * len(known) + list(found))
+            if ok
+        ]
+
+    async def get_playlist(self, url, from_cache=True):
+        cached = self.get_cached_playlist(url, from_cache)
+
+        if self.is_playlist_fresh(cached):
+            return cached
+
+        req = await self.session.get_session().get(url, headers=self.get_revalidation_headers(cached))
+
+        return self.parse_playlist_response(url, req, cached)
+
+    async def get_channel_videos(self, login, broadcast_types=None, from_cache=True, page_size=None):
+        if type(login) is not str or len(login) < 1:
+            raise TwitchException('Invalid channel')
+
+        since_id = self.get_channel_since_id(login, broadcast_types, from_cache)
+        videos = []
+        cursor = None
+
+        while True:
+            page, cursor = self.parse_channel_page((await self.session.create_request(
+                self.get_channel_videos_queries(login, cursor, page_size or self.CHANNEL_PAGE_SIZE)
+            ))[0])
+            kept, reached = self.filter_channel_page(page, broadcast_types, since_id)
+            videos.extend(kept)
+
+            if reached or not cursor:
+                return videos
+
+    async def get_clip_data(self, clip_slug, from_cache=True):
+        if type(clip_slug) is not str or len(clip_slug) < 1:
+            raise TwitchException('Invalid clip id')
+
+        if from_cache:
+            track = self.get_cached(f'clip:{clip_slug}')
+
+            if track:
+                return track
+
+        return self.build_clip(clip_slug, (await self.session.create_request(self.get_clip_queries(clip_slug)))[0])
+
+    async def get_clips_data(self, clip_slugs, from_cache=True, batch_size=None):
+        results, to_fetch = self.split_cached(clip_slugs, 'clip', from_cache)
+
+        async def fetch_batch(batch):
+            try:
+                responses = await self.session.create_request([query for slug in batch for query in self.get_clip_queries(slug)])
+            except (TwitchException, httpx.HTTPError) as e:
+                return {slug: e for slug in batch}
+
+            batch_results = {}
+
+            for index, slug in enumerate(batch):
+                try:
+                    batch_results[slug] = self.build_clip(slug, responses[index] if index < len(responses) else None)
+                except TwitchException as e:
+                    batch_results[slug] = e
+
+            return batch_results
+
+        for batch_results in await asyncio.gather(*[
+            fetch_batch(batch) for batch in chunks(to_fetch, batch_size or self.BULK_BATCH_SIZE)
+        ]):
+            results.update(batch_results)
+
+        return results
@@ -0,0 +1,58 @@
+import re
+
+import httpx
+
+from tvod.constants import TWITCH_GQL_URL, TWITCH_URL
+from tvod.helpers import is_http2_available
+from tvod.helpers.exceptions import TwitchException
+
+
+class AsyncSession:
+    # One long-lived pooled connection set shared by every request of the client
+    def __init__(self, client, concurrency=16, http2=True):
+        self.client = client
+        self.concurrency = concurrency
+        self.http2 = http2
+        self._session = None
+        self._twitch_client_id = self.client.cache.get('twitch_client_id')
+
+    async def get_twitch_client_id(self):
+        if not self._twitch_client_id:
+            req = await self.get_session().get(TWITCH_URL)
+
+            if 'clientId' not in req.text:
+                raise TwitchException('Unable to find twitch client id')
+
+            client_id = re.search(r'clientId="([^"]+)', req.text)
+            if not client_id:
+                raise TwitchException('Unable to find twitch client id')
+
+            self.client.cache.set('twitch_client_id', client_id.group(1), self.client.KEEP_IN_CACHE)
+            self._twitch_client_id = client_id.group(1)
+        return self._twitch_client_id
+
+    def get_session(self):
+        if not self._session or self._session.is_closed:
+            self._session = httpx.AsyncClient(
+                proxies=str(self.client.proxy) if self.client.proxy else None,
+                http2=self.http2 and is_http2_available(),
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            )
+        return self._session
+
+    async def create_request(self, data):
+        req = await self.get_session().post(
+            TWITCH_GQL_URL,
+            json=data,
+            headers={'Client-Id': await self.get_twitch_client_id()}
+        )
+
+        if req.status_code != httpx.codes.OK:
+            raise TwitchException('Unable to create GQL request')
+
+        return req.json()
+
+    async def close(self):
+        if self._session:
+            await self._session.aclose()
+            self._session = None
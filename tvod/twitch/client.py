@@ -1,32 +1,54 @@
 import datetime
 import re
+import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 
 import httpx
 import m3u8
 
-from tvod.cacher import Cacher
+from tvod.cacher import Cacher, SQLiteBackend
 from tvod.constants import TWITCH_STREAMS_URL, TWITCH_VOD_QUALITIES
+from tvod.helpers import chunks
+from tvod.helpers.enums.broadcast_type import BroadcastType
 from tvod.helpers.exceptions import TwitchException
 from tvod.helpers.paths import DefaultPaths
 from tvod.helpers.proxy import Proxy
+from tvod.helpers.timer import Timings
+from tvod.models.channel import ChannelVideo
+from tvod.models.playlist import MediaPlaylist
 from tvod.models.vod import Stream, VOD
 from tvod.twitch.session import Session
 
 
-class Client:
+class BaseClient:
+    # Request building and response parsing shared by Client and AsyncClient
     KEEP_IN_CACHE = 3000
-
-    def __init__(self, cache_path=None, proxy=None):
-        if proxy and type(proxy) != Proxy:
+    # Maximum number of restricted VOD playlists probed at the same time
+    PROBE_CONCURRENCY = 8
+    # Number of ids packed in one GQL request by the bulk methods (Twitch accepts up to 35 operations)
+    BULK_BATCH_SIZE = 15
+    # Maximum number of ids resolved (usher, probes) at the same time by the bulk methods
+    BULK_CONCURRENCY = 8
+    # Number of videos requested per page when crawling a channel (maximum allowed by Twitch)
+    CHANNEL_PAGE_SIZE = 100
+    # Media playlists are kept a week to be revalidated with ETag/Last-Modified
+    PLAYLIST_KEEP_IN_CACHE = 7 * 24 * 3600
+    # Finished playlists are used without any request for an hour, Twitch still edits them afterwards (muted segments)
+    PLAYLIST_FRESH_FOR = 3600
+
+    def __init__(self, cache_path=None, proxy=None, cache_backend=SQLiteBackend, cache_max_entries=None, cache_max_bytes=None):
+        if proxy and type(proxy) is not Proxy:
             raise ValueError('Invalid proxy provided')
 
         self.proxy = proxy
         self.cache = Cacher(
             'twitch',
-            (cache_path or DefaultPaths.get_cache_path())
+            (cache_path or DefaultPaths.get_cache_path()),
+            cache_backend,
+            max_entries=cache_max_entries,
+            max_bytes=cache_max_bytes
         )
-        self.session = Session(self)
 
     @staticmethod
     def parse_url(url):
@@ -35,24 +57,58 @@ class Client:
             url
         )
 
-        if not match:
+        if match:
+            return match.group(3), match.group(4)
+
+        match = re.match(
+            r'https?://(www\.|m\.)?twitch\.tv/(\w+)(/videos)?/?(\?.*)?$',
+            url
+        )
+
+        if not match or match.group(2) in ['videos', 'clip', 'directory']:
             raise TwitchException('Invalid URL provided')
 
-        return match.group(3), match.group(4)
+        return 'channel', match.group(2).lower()
 
-    def get_vod_data(self, vod_id, from_cache=True):
-        if type(vod_id) != str or len(vod_id) < 1:
-            raise TwitchException('Invalid VOD id')
+    def get_cached(self, key):
+        track_or_exc = self.cache.get(key)
 
-        if from_cache:
-            track_or_exc = self.cache.get(f'vod:{vod_id}')
+        if track_or_exc and type(track_or_exc) is TwitchException:
+            raise track_or_exc
+        return track_or_exc
+
+    def split_cached(self, ids, prefix, from_cache=True):
+        # Return results already known from the cache and the ids left to fetch
+        results = {}
+        to_fetch = []
+
+        for item_id in dict.fromkeys(ids):
+            if type(item_id) is not str or len(item_id) < 1:
+                results[item_id] = TwitchException('Invalid id')
+                continue
+
+            if from_cache:
+                try:
+                    track = self.get_cached(f'{prefix}:{item_id}')
+                except TwitchException as e:
+                    track = e
 
-            if track_or_exc:
-                if type(track_or_exc) == TwitchException:
-                    raise track_or_exc
-                return track_or_exc
+                if track:
+                    results[item_id] = track
+                    continue
+
+            to_fetch.append(item_id)
+
+        return results, to_fetch
+
+    @staticmethod
+    def get_vod_cache_keys(vod_id, quality=None):
+        # VODs resolved for a single quality are cached apart from fully resolved ones
+        return [f'vod:{vod_id}'] + ([f'vod:{vod_id}@{quality}'] if quality else [])
 
-        video_playback, vod = self.session.create_request([
+    @staticmethod
+    def get_vod_queries(vod_id):
+        return [
             {
                 'query': """
                     query ($vodID: ID!) {
@@ -85,76 +141,97 @@ class Client:
                 """,
                 'variables': {'vodID': vod_id}
             }
-        ])
+        ]
+
+    @staticmethod
+    def get_response_data(response):
+        # `data` is null (or the response missing) when the GQL operation failed, raised for this id only
+        # and not cached as the next request may succeed
+        data = (response or {}).get('data')
+
+        if data is None:
+            raise TwitchException('Unable to fetch data')
+        return data
 
-        video_playback = video_playback.get('data').get('videoPlaybackAccessToken')
-        vod = vod.get('data').get('video')
+    def parse_vod_response(self, vod_id, video_playback=None, vod=None):
+        video_playback = self.get_response_data(video_playback).get('videoPlaybackAccessToken')
+        vod = self.get_response_data(vod).get('video')
 
         if not video_playback or not vod:
             exc = TwitchException('Invalid or unavailable VOD data')
-            self.cache.set(f'vod:{vod_id}', exc, Client.KEEP_IN_CACHE)
+            self.cache.set(f'vod:{vod_id}', exc, self.KEEP_IN_CACHE)
             raise exc
 
-        with self.session.get_session() as session:
-            req = session.get(f'{TWITCH_STREAMS_URL}/{vod_id}.m3u8', params={
-                'token': video_playback.get('value'),
-                'sig': video_playback.get('signature'),
-                'allow_source': 'true'
-            })
+        return video_playback, vod
+
+    @staticmethod
+    def get_usher_request(vod_id, video_playback):
+        return f'{TWITCH_STREAMS_URL}/{vod_id}.m3u8', {
+            'token': video_playback.get('value'),
+            'sig': video_playback.get('signature'),
+            'allow_source': 'true'
+        }
 
+    @staticmethod
+    def parse_usher_playlist(text):
         streams = []
+        playlist = m3u8.parser.parse(text)
 
-        if req.status_code == httpx.codes.OK:
-            playlist = m3u8.parser.parse(req.text)
+        for stream in playlist.get('playlists'):
+            width, height = stream.get('stream_info').get('resolution').split('x')
+            streams.append(Stream(**{
+                'height': height,
+                'width': width,
+                'url': stream.get('uri')
+            }))
 
-            for stream in playlist.get('playlists'):
-                width, height = stream.get('stream_info').get('resolution').split('x')
-                streams.append(Stream(**{
-                    'height': height,
-                    'width': width,
-                    'url': stream.get('uri')
-                }))
-        elif req.status_code == httpx.codes.FORBIDDEN:
-            if not vod.get('seekPreviewsURL'):
-                raise TwitchException('Unable to fetch VOD data')
+        return streams
+
+    @staticmethod
+    def get_restricted_urls(vod_id, vod):
+        # Usher refuses sub-only VODs, their playlists are guessed from the storyboards location
+        if not vod.get('seekPreviewsURL'):
+            raise TwitchException('Unable to fetch VOD data')
 
-            parsed_url = urllib.parse.urlparse(vod.get('seekPreviewsURL'))
+        parsed_url = urllib.parse.urlparse(vod.get('seekPreviewsURL'))
 
-            try:
-                paths = parsed_url.path.split('/')
-                stream_id = paths[paths.index('storyboards') - 1]
-            except ValueError:
-                raise TwitchException('Unable to fetch VOD data')
-
-            is_old_upload = (
-                (datetime.datetime.fromisoformat(
-                    '2023-02-10'
-                ).timestamp() * 1000) - (datetime.datetime.strptime(
-                    vod.get('createdAt'),
-                    '%Y-%m-%dT%H:%M:%SZ'
-                ).timestamp() * 1000)
-            ) / (1000 * 3600 * 24) > 7
-
-            for quality_key, quality in TWITCH_VOD_QUALITIES:
-                if vod.get('broadcastType') == 'HIGHLIGHT':
-                    url = f'https://{parsed_url.netloc}/{stream_id}/{quality_key}/highlight-{vod_id}.m3u8'
-                elif vod.get('broadcastType') == 'UPLOAD' and is_old_upload:
-                    url = f'https://{parsed_url.netloc}/{vod.get("owner").get("login")}/{vod_id}/' \
-                          f'{stream_id}/{quality_key}/index-dvr.m3u8'
-                else:
-                    url = f'https://{parsed_url.netloc}/{stream_id}/{quality_key}/index-dvr.m3u8'
-
-                with self.session.get_session() as session:
-                    req = session.get(url)
-
-                if req.status_code == httpx.codes.OK:
-                    streams.append(Stream(**{
-                        **quality,
-                        'url': url
-                    }))
-        else:
+        try:
+            paths = parsed_url.path.split('/')
+            stream_id = paths[paths.index('storyboards') - 1]
+        except ValueError:
             raise TwitchException('Unable to fetch VOD data')
 
+        is_old_upload = (
+            (datetime.datetime.fromisoformat(
+                '2023-02-10'
+            ).timestamp() * 1000) - (datetime.datetime.strptime(
+                vod.get('createdAt'),
+                '%Y-%m-%dT%H:%M:%SZ'
+            ).timestamp() * 1000)
+        ) / (1000 * 3600 * 24) > 7
+
+        urls = []
+
+        for quality_key, quality in TWITCH_VOD_QUALITIES:
+            if vod.get('broadcastType') == 'HIGHLIGHT':
+                url = f'https://{parsed_url.netloc}/{stream_id}/{quality_key}/highlight-{vod_id}.m3u8'
+            elif vod.get('broadcastType') == 'UPLOAD' and is_old_upload:
+                url = f'https://{parsed_url.netloc}/{vod.get("owner").get("login")}/{vod_id}/' \
+                      f'{stream_id}/{quality_key}/index-dvr.m3u8'
+            else:
+                url = f'https://{parsed_url.netloc}/{stream_id}/{quality_key}/index-dvr.m3u8'
+
+            urls.append((quality, url))
+
+        return urls
+
+    @staticmethod
+    def filter_restricted_urls(urls, quality=None):
+        if not quality:
+            return urls
+        return [(q, url) for q, url in urls if Stream(**{**q, 'url': url}).resolution == quality]
+
+    def build_vod(self, vod_id, vod, streams, cache_key=None):
         if len(streams) < 1:
             raise TwitchException('Unable to fetch VOD data')
 
@@ -165,23 +242,65 @@ class Client:
             'streams': streams
         })
 
-        self.cache.set(f'vod:{vod_id}', vod, Client.KEEP_IN_CACHE)
+        self.cache.set(cache_key or f'vod:{vod_id}', vod, self.KEEP_IN_CACHE)
 
         return vod
 
-    def get_clip_data(self, clip_slug, from_cache=True):
-        if type(clip_slug) != str or len(clip_slug) < 1:
-            raise TwitchException('Invalid clip id')
+    @staticmethod
+    def get_playlist_cache_key(url):
+        return f'playlist:{url}'
 
-        if from_cache:
-            track_or_exc = self.cache.get(f'clip:{clip_slug}')
+    def get_cached_playlist(self, url, from_cache=True):
+        if not from_cache:
+            return None
+        return self.cache.get(self.get_playlist_cache_key(url))
+
+    def is_playlist_fresh(self, playlist):
+        return playlist is not None and playlist.ended and time.time() - playlist.checked < self.PLAYLIST_FRESH_FOR
+
+    @staticmethod
+    def get_revalidation_headers(playlist=None):
+        headers = {}
+
+        if playlist and playlist.etag:
+            headers['If-None-Match'] = playlist.etag
+        if playlist and playlist.last_modified:
+            headers['If-Modified-Since'] = playlist.last_modified
+
+        return headers
+
+    def parse_playlist_response(self, url, response, cached=None):
+        if cached and response.status_code == httpx.codes.NOT_MODIFIED:
+            cached.checked = time.time()
+            self.cache.set(self.get_playlist_cache_key(url), cached, self.PLAYLIST_KEEP_IN_CACHE)
+            return cached
+
+        if response.status_code != httpx.codes.OK:
+            raise TwitchException('Unable to fetch playlist')
+
+        playlist = MediaPlaylist.parse(
+            url,
+            response.text,
+            response.headers.get('ETag'),
+            response.headers.get('Last-Modified')
+        )
+        self.cache.set(self.get_playlist_cache_key(url), playlist, self.PLAYLIST_KEEP_IN_CACHE)
+
+        return playlist
+
+    def split_probed(self, urls):
+        # Candidates with a fresh finished playlist in the cache are known to exist, only the others are probed
+        known = []
+        to_probe = []
+
+        for quality, url in urls:
+            (known if self.is_playlist_fresh(self.get_cached_playlist(url)) else to_probe).append((quality, url))
 
-            if track_or_exc:
-                if type(track_or_exc) == TwitchException:
-                    raise track_or_exc
-                return
+        return known, to_probe
 
-        clip_data = self.session.create_request([
+    @staticmethod
+    def get_clip_queries(clip_slug):
+        return [
             {
                 'query': """
                     query ($clipSlug: ID!) {
@@ -204,22 +323,105 @@ class Client:
                 """,
                 'variables': {'clipSlug': clip_slug}
             }
-        ])[0].get('data').get('clip')
+        ]
+
+    @staticmethod
+    def get_channel_cache_key(login, broadcast_types=None):
+        # The last synced id is remembered per set of broadcast types
+        broadcast_types = sorted(set(broadcast_types or []))
 
-        print(clip_data)
+        if not broadcast_types or broadcast_types == sorted(BroadcastType.values()):
+            return f'channel:{login}'
+        return f'channel:{login}@{",".join(broadcast_types)}'
+
+    @staticmethod
+    def get_channel_videos_queries(login, cursor=None, page_size=100):
+        return [
+            {
+                'query': """
+                    query ($login: String!, $first: Int!, $after: Cursor) {
+                        user(login: $login) {
+                            videos(first: $first, after: $after, sort: TIME) {
+                                edges {
+                                    cursor,
+                                    node { id, title, broadcastType, createdAt }
+                                }
+                                pageInfo { hasNextPage }
+                            }
+                        }
+                    }
+                """,
+                'variables': {'login': login, 'first': page_size, 'after': cursor}
+            }
+        ]
+
+    @staticmethod
+    def parse_channel_page(response):
+        # Return the videos of one page (newest first) and the cursor of the next page
+        user = (response.get('data') or {}).get('user')
+
+        if not user or not user.get('videos'):
+            raise TwitchException('Unable to find channel')
+
+        edges = user.get('videos').get('edges') or []
+        videos = [
+            ChannelVideo(**{
+                'id': edge.get('node').get('id'),
+                'title': edge.get('node').get('title') or '',
+                'broadcast_type': edge.get('node').get('broadcastType').lower(),
+                'created_at': edge.get('node').get('createdAt')
+            })
+            for edge in edges
+        ]
+
+        if not edges or not user.get('videos').get('pageInfo').get('hasNextPage'):
+            return videos, None
+        return videos, edges[-1].get('cursor')
+
+    @staticmethod
+    def filter_channel_page(videos, broadcast_types=None, since_id=None):
+        # Keep the wanted videos newer than `since_id`, also tell if the crawl can stop there
+        kept = []
+
+        for video in videos:
+            if since_id and int(video.id) <= int(since_id):
+                return kept, True
+
+            if not broadcast_types or video.broadcast_type in broadcast_types:
+                kept.append(video)
+
+        return kept, False
+
+    def get_channel_since_id(self, login, broadcast_types=None, from_cache=True):
+        if not from_cache:
+            return None
+        return self.cache.get(self.get_channel_cache_key(login, broadcast_types))
+
+    def mark_channel_synced(self, login, vod_id, broadcast_types=None):
+        # Kept without expiration, the next crawl of this channel stops at `vod_id`.
+        # Only ever moves forward, a --full crawl failing on an old video keeps the newer marker.
+        cache_key = self.get_channel_cache_key(login, broadcast_types)
+        synced_id = self.cache.get(cache_key)
+
+        if synced_id and int(synced_id) >= int(vod_id):
+            return
+        self.cache.set(cache_key, vod_id)
+
+    def build_clip(self, clip_slug, clip_data):
+        clip_data = self.get_response_data(clip_data).get('clip') or {}
 
         video_playback = clip_data.get('playbackAccessToken')
         clip_videos = clip_data.get('videoQualities')
 
         if not video_playback or not clip_videos:
             exc = TwitchException('Invalid or unavailable VOD data')
-            self.cache.set(f'clip:{clip_slug}', exc, Client.KEEP_IN_CACHE)
+            self.cache.set(f'clip:{clip_slug}', exc, self.KEEP_IN_CACHE)
             raise exc
 
         clip = VOD(**{
             'id': clip_slug,
             'title': clip_data.get('title'),
-            'streamer': clip_data.get('broadcaster').get('displayName'),
+            'streamer': (clip_data.get('broadcaster') or {}).get('displayName'),
             'streams': [
                 Stream(**{
                     'height': int(video.get('quality')),
@@ -238,6 +440,165 @@ class Client:
             ]
         })
 
-        self.cache.set(f'vod:{clip_slug}', clip, Client.KEEP_IN_CACHE)
+        self.cache.set(f'clip:{clip_slug}', clip, self.KEEP_IN_CACHE)
 
         return clip
+
+
+class Client(BaseClient):
+    def __init__(self, cache_path=None, proxy=None, cache_backend=SQLiteBackend, cache_max_entries=None, cache_max_bytes=None):
+        super().__init__(cache_path, proxy, cache_backend, cache_max_entries, cache_max_bytes)
+        self.session = Session(self)
+
+    def get_vod_data(self, vod_id, from_cache=True, quality=None, timings=None):
+        # When `quality` is given only matching restricted playlists are probed,
+        # `timings` (a Timings instance) receives the duration of each metadata phase
+        if type(vod_id) is not str or len(vod_id) < 1:
+            raise TwitchException('Invalid VOD id')
+
+        timings = Timings() if timings is None else timings
+        cache_keys = self.get_vod_cache_keys(vod_id, quality)
+
+        if from_cache:
+            for cache_key in cache_keys:
+                track = self.get_cached(cache_key)
+
+                if track:
+                    return track
+
+        with timings.measure('gql'):
+            responses = self.session.create_request(self.get_vod_queries(vod_id))
+
+        return self.resolve_vod(vod_id, responses, quality, timings)
+
+    def get_vods_data(self, vod_ids, from_cache=True, batch_size=None):
+        # Resolve many VODs with one GQL request per batch of ids,
+        # return a dict of id to VOD or to the TwitchException raised for it
+        results, to_fetch = self.split_cached(vod_ids, 'vod', from_cache)
+
+        for batch in chunks(to_fetch, batch_size or self.BULK_BATCH_SIZE):
+            try:
+                responses = self.session.create_request([query for vod_id in batch for query in self.get_vod_queries(vod_id)])
+            except (TwitchException, httpx.HTTPError) as e:
+                results.update({vod_id: e for vod_id in batch})
+                continue
+
+            def resolve(index):
+                try:
+                    return self.resolve_vod(batch[index], responses[index * 2:index * 2 + 2])
+                except (TwitchException, httpx.HTTPError) as e:
+                    return e
+
+            with ThreadPoolExecutor(max_workers=min(self.BULK_CONCURRENCY, len(batch))) as executor:
+                results.update(zip(batch, executor.map(resolve, range(len(batch)))))
+
+        return results
+
+    def resolve_vod(self, vod_id, responses, quality=None, timings=None):
+        timings = Timings() if timings is None else timings
+        video_playback, vod = self.parse_vod_response(vod_id, *responses)
+
+        usher_url, usher_params = self.get_usher_request(vod_id, video_playback)
+
+        with timings.measure('usher'), self.session.get_session() as session:
+            req = session.get(usher_url, params=usher_params)
+
+        if req.status_code == httpx.codes.OK:
+            return self.build_vod(vod_id, vod, self.parse_usher_playlist(req.text))
+        elif req.status_code != httpx.codes.FORBIDDEN:
+            raise TwitchException('Unable to fetch VOD data')
+
+        with timings.measure('probes'):
+            streams = self.probe_streams(self.filter_restricted_urls(self.get_restricted_urls(vod_id, vod), quality))
+
+        return self.build_vod(vod_id, vod, streams, self.get_vod_cache_keys(vod_id, quality)[-1])
+
+    def probe_streams(self, urls):
+        # Probe every candidate playlist concurrently over one pooled session,
+        # the playlists found are cached so downloading them doesn't fetch them again
+        known, urls = self.split_probed(urls)
+        found = []
+
+        def probe(url):
+            req = session.get(url)
+
+            if req.status_code != httpx.codes.OK:
+                return False
+
+            self.parse_playlist_response(url, req)
+            return True
+
+        if urls:
+            with self.session.get_session() as session, \
+                    ThreadPoolExecutor(max_workers=min(self.PROBE_CONCURRENCY, len(urls))) as executor:
+                found = list(executor.map(lambda url: probe(url[1]), urls))
+
+        return [
+            Stream(**{
+                **quality,
+                'url': url
+            })
+            for (quality, url), ok in zip(known + urls, [True] * len(known) + found)
+            if ok
+        ]
+
+    def get_playlist(self, url, from_cache=True):
+        # Recently checked finished playlists are served from the cache, the others are revalidated with ETag/Last-Modified
+        cached = self.get_cached_playlist(url, from_cache)
+
+        if self.is_playlist_fresh(cached):
+            return cached
+
+        with self.session.get_session() as session:
+            req = session.get(url, headers=self.get_revalidation_headers(cached))
+
+        return self.parse_playlist_response(url, req, cached)
+
+    def get_channel_videos(self, login, broadcast_types=None, from_cache=True, page_size=None):
+        # Walk the videos of a channel page by page, newest first, down to the last synced one
+        if type(login) is not str or len(login) < 1:
+            raise TwitchException('Invalid channel')
+
+        since_id = self.get_channel_since_id(login, broadcast_types, from_cache)
+        videos = []
+        cursor = None
+
+        while True:
+            page, cursor = self.parse_channel_page(self.session.create_request(
+                self.get_channel_videos_queries(login, cursor, page_size or self.CHANNEL_PAGE_SIZE)
+            )[0])
+            kept, reached = self.filter_channel_page(page, broadcast_types, since_id)
+            videos.extend(kept)
+
+            if reached or not cursor:
+                return videos
+
+    def get_clip_data(self, clip_slug, from_cache=True):
+        if type(clip_slug) is not str or len(clip_slug) < 1:
+            raise TwitchException('Invalid clip id')
+
+        if from_cache:
+            track = self.get_cached(f'clip:{clip_slug}')
+
+            if track:
+                return track
+
+        return self.build_clip(clip_slug, self.session.create_request(self.get_clip_queries(clip_slug))[0])
+
+    def get_clips_data(self, clip_slugs, from_cache=True, batch_size=None):
+        results, to_fetch = self.split_cached(clip_slugs, 'clip', from_cache)
+
+        for batch in chunks(to_fetch, batch_size or self.BULK_BATCH_SIZE):
+            try:
+                responses = self.session.create_request([query for slug in batch for query in self.get_clip_queries(slug)])
+            except (TwitchException, httpx.HTTPError) as e:
+                results.update({slug: e for slug in batch})
+                continue
+
+            for index, slug in enumerate(batch):
+                try:
+                    results[slug] = self.build_clip(slug, responses[index] if index < len(responses) else None)
+                except TwitchException as e:
+                    results[slug] = e
+
+        return results